@@ -1,23 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.security import  verify_password, create_access_token
-from app.users.crud import user_crud
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.security import verify_and_update_password_async, create_access_token
+from app.users.crud import async_user_crud
 from app.users.schemas import UserCreate, UserResponse
-from app.db.session import get_db
+from app.db.session import get_async_db
+from app.core.metrics import InstrumentedRoute
 from fastapi.security import OAuth2PasswordRequestForm
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = user_crud.get_user_by_username(db, user.username)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await async_user_crud.get_user_by_username(db, user.username)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists."
         )
-    created_user = user_crud.create_user(
+    created_user = await async_user_crud.create_user(
         db=db,
         first_name=user.first_name,
         last_name=user.last_name,
@@ -32,13 +33,18 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     return created_user
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(),db: Session = Depends(get_db)):
-    user = user_crud.get_user_by_username(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(),db: AsyncSession = Depends(get_async_db)):
+    user = await async_user_crud.get_user_by_username(db, form_data.username)
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"}
         )
+    if new_hash:
+        await async_user_crud.update_password_hash(db, user, new_hash)
     token = create_access_token(subject=user.username)
     return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
@@ -0,0 +1,57 @@
+from typing import List
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from app.core.cache import principal_cache, task_query_cache
+from app.core.dependencies import require_internal_token
+from app.core.metrics import COLLECTORS, render_metrics
+from app.db import session
+from app.db.session import pool_status
+from app.tasks.events import task_event_broker
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+# served at the application root, where Prometheus expects it
+metrics_router = APIRouter()
+
+
+@router.get("/metrics")
+def get_internal_metrics():
+    return {
+        "pools": {
+            "sync": pool_status(session.engine.pool),
+            "async": pool_status(session.async_engine.pool),
+            **_replica_pools(),
+        },
+        "replicas": session.replica_router.stats(),
+        "principal_cache": principal_cache.stats(),
+        "task_query_cache": task_query_cache.stats(),
+        "task_events": task_event_broker.stats(),
+    }
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def _replica_pools() -> dict:
+    return {f"replica-{index}": pool_status(replica.pool) for index, replica in enumerate(session.replica_router.engines)}
+
+
+def _pool_metrics() -> List[str]:
+    gauges = {
+        "db_pool_size": ("gauge", "size", "Connections kept open by the pool."),
+        "db_pool_checked_out": ("gauge", "checked_out", "Connections in use."),
+        "db_pool_overflow": ("gauge", "overflow", "Connections open beyond the pool size."),
+        "db_pool_checkouts_total": ("counter", "checkouts", "Connection checkouts."),
+        "db_pool_timeouts_total": ("counter", "timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS."),
+        "db_pool_checkout_wait_seconds_total": ("counter", "wait_seconds_total", "Time spent waiting for a connection."),
+    }
+    pools = {"sync": pool_status(session.engine.pool), "async": pool_status(session.async_engine.pool), **_replica_pools()}
+    lines = []
+    for name, (kind, key, documentation) in gauges.items():
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{engine="{label}"}} {status[key]}' for label, status in pools.items() if key in status]
+    return lines
+
+
+COLLECTORS.append(_pool_metrics)
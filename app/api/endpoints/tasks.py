@@ -1,18 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import Optional
-from app.core.dependencies import get_db, get_current_user
-from app.tasks.crud import task_crud, TaskCRUDResult
-from app.tasks.schemas import (TaskResponse, TaskCreate, TaskUpdate, TaskStatus,PaginatedResponse)
+import asyncio
+import io
+import time
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, Response
+from fastapi.responses import StreamingResponse, ORJSONResponse, JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, List
+from app.core.config import settings
+from app.core.dependencies import get_async_db, get_async_read_db, get_current_user_async
+from app.core.etag import weak_etag, etag_matches
+from app.core.metrics import InstrumentedRoute
+from app.db.session import get_async_session_factory
+from app.core.pagination import encode_cursor, decode_cursor, decode_ranked_cursor
+from app.tasks.crud import async_task_crud, TaskCRUDResult
+from app.tasks.events import task_event_broker
+from app.tasks.export import encode_export, MEDIA_TYPES
+from app.tasks.importer import check_utf8, validated_chunks, record_failed_chunk, finish_report
+from app.tasks.schemas import (TaskResponse, TaskCreate, TaskUpdate, TaskStatus,PaginatedResponse, TaskFileFormat, TaskFieldsResponse,
+                               TaskBulkCreate, TaskBulkStatusUpdate, TaskBulkDelete, TaskBulkItemResult, TaskBulkResponse,
+                               TaskImportReport, TaskChange, TaskChangesResponse, TaskStatsResponse)
 from app.users.models import User
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 
 @router.patch("/{task_id}/complete", response_model=TaskResponse)
-async def mark_task_complete(task_id: int, current_user: User = Depends(get_current_user),
-                             db: Session = Depends(get_db)):
-    updated_task, result = task_crud.update_task(
+async def mark_task_complete(task_id: int, current_user: User = Depends(get_current_user_async),
+                             db: AsyncSession = Depends(get_async_db)):
+    updated_task, result = await async_task_crud.update_task(
         db=db,
         task_id=task_id,
         user_id=current_user.id,
@@ -31,68 +46,378 @@ async def mark_task_complete(task_id: int, current_user: User = Depends(get_curr
         )
     return updated_task
 
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor"
+    )
+
+
+async def _tasks_etag(db: AsyncSession, user_id: int) -> str:
+    # one indexed read instead of the list and count queries
+    return weak_etag(user_id, await async_task_crud.get_task_version(db, user_id))
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def _with_etag(result, response: Response, etag: str):
+    # headers set on the injected response are dropped when a Response is returned
+    target = result if isinstance(result, Response) else response
+    target.headers["ETag"] = etag
+    return result
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(TaskFieldsResponse.model_fields))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return [f for f in requested if f != "id"]
+
+
+def _paginate(tasks: list, total: Optional[int], page: int, size: int, cursor: Optional[str],
+              fields: Optional[List[str]] = None):
+    # tasks were fetched with limit=size + 1, the extra row only signals a next page
+    has_more = len(tasks) > size
+    tasks = tasks[:size]
+    total_pages = (total + size - 1) // size if total is not None else None
+    content = dict(
+        items=tasks,
+        total=total,
+        page=page,
+        pages=total_pages,
+        size=size,
+        has_next=has_more,
+        has_prev=cursor is not None or page > 1,
+        next_cursor=encode_cursor(tasks[-1].id) if has_more else None
+    )
+    if settings.FAST_JSON_RESPONSES:
+        # items are TASK_ROW_COLUMNS rows, already in TaskResponse shape, so skip
+        # response_model validation and encode them straight with orjson
+        content["items"] = [row._asdict() for row in tasks]
+        return ORJSONResponse(content)
+    if fields is not None:
+        # rows only hold the requested columns, which TaskResponse would reject
+        content["items"] = [row._asdict() for row in tasks]
+        slim_page = PaginatedResponse[TaskFieldsResponse](**content)
+        return JSONResponse(slim_page.model_dump(mode="json", exclude_unset=True))
+    return PaginatedResponse(**content)
+
+
 @router.get("/", response_model=PaginatedResponse[TaskResponse])
 async def get_tasks(
+        request: Request,
+        response: Response,
         status: Optional[TaskStatus] = Query(None),
         page: int = Query(1, ge=1),
         size: int = Query(10, ge=1, le=100),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page, replaces page"),
+        include_total: bool = Query(True, description="Set to false to skip counting total and pages"),
+        fields: Optional[str] = Query(None, description="Comma separated task fields to return, id is always included"),
+        include_archived: bool = Query(False, description="Also list archived tasks, implied by status=COMPLETED"),
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_read_db)
 ):
-    skip = (page - 1) * size
-    tasks = task_crud.get_user_tasks(
+    try:
+        after_id = decode_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        raise _invalid_cursor()
+    field_names = _parse_fields(fields)
+    # archived tasks are all completed, other lists only need the hot table
+    include_archived = include_archived or status == TaskStatus.COMPLETED
+    etag = await _tasks_etag(db, current_user.id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+    skip = (page - 1) * size if cursor is None else 0
+    tasks = await async_task_crud.get_user_tasks(
         db=db,
         user_id=current_user.id,
         status=status,
         skip=skip,
-        limit=size
+        limit=size + 1,
+        after_id=after_id,
+        as_rows=settings.FAST_JSON_RESPONSES or field_names is not None,
+        fields=field_names,
+        include_archived=include_archived
+    )
+    total = None
+    if include_total:
+        total = await async_task_crud.count_user_tasks(
+            db=db,
+            user_id=current_user.id,
+            status=status,
+            include_archived=include_archived
+        )
+    return _with_etag(_paginate(tasks, total, page, size, cursor, field_names), response, etag)
+
+
+@router.get("/all", response_model=PaginatedResponse[TaskResponse])
+async def get_all_tasks(
+        page: int = Query(1, ge=1),
+        size: int = Query(10, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page, replaces page"),
+        include_total: bool = Query(True, description="Set to false to skip counting total and pages"),
+        fields: Optional[str] = Query(None, description="Comma separated task fields to return, id is always included"),
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_read_db)
+):
+    try:
+        after_id = decode_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        raise _invalid_cursor()
+    field_names = _parse_fields(fields)
+    skip = (page - 1) * size if cursor is None else 0
+    tasks = await async_task_crud.get_all_tasks(db=db, skip=skip, limit=size + 1, after_id=after_id,
+                                                as_rows=settings.FAST_JSON_RESPONSES or field_names is not None,
+                                                fields=field_names)
+    total = await async_task_crud.count_all_tasks(db=db) if include_total else None
+    return _paginate(tasks, total, page, size, cursor, field_names)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_tasks(
+        status: Optional[TaskStatus] = Query(None),
+        export_format: TaskFileFormat = Query(TaskFileFormat.NDJSON, alias="format"),
+        gzip: bool = Query(False),
+        include_archived: bool = Query(False, description="Also export archived tasks, implied by status=COMPLETED"),
+        current_user: User = Depends(get_current_user_async),
+        session_factory: async_sessionmaker = Depends(get_async_session_factory)
+):
+    user_id = current_user.id
+    # same rule as the task list
+    include_archived = include_archived or status == TaskStatus.COMPLETED
+
+    async def batches():
+        # the response outlives the request dependencies, so the stream owns its session
+        async with session_factory() as db:
+            async for rows in async_task_crud.stream_user_tasks(db, user_id=user_id, status=status,
+                                                                 include_archived=include_archived):
+                yield rows
+
+    headers = {"Content-Disposition": f'attachment; filename="tasks.{export_format.value}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        encode_export(batches(), export_format, gzip=gzip),
+        media_type=MEDIA_TYPES[export_format],
+        headers=headers
     )
-    total = task_crud.count_user_tasks(
+
+
+@router.get("/changes", response_model=TaskChangesResponse)
+async def get_task_changes(
+        since: Optional[int] = Query(None, ge=0, description="revision of the previous response, omit for a full sync"),
+        limit: int = Query(500, ge=1, le=1000),
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_read_db)
+):
+    changes, has_more = await async_task_crud.get_task_changes(
         db=db,
         user_id=current_user.id,
-        status=status
+        since=since,
+        limit=limit
     )
-    total_pages = (total + size - 1) // size
-    return PaginatedResponse(
-        items=tasks,
-        total=total,
-        page=page,
-        pages=total_pages,
-        size=size,
-        has_next=page < total_pages,
-        has_prev=page > 1
+    # read after the changes, so tombstones pruned in between are caught too
+    if since is not None and since < await async_task_crud.get_pruned_revision(db, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Deletes after this revision were pruned, sync again without since"
+        )
+    return TaskChangesResponse(
+        changes=[
+            TaskChange(id=task_id, revision=revision, deleted=task is None, task=task)
+            for revision, task_id, task in changes
+        ],
+        revision=changes[-1][0] if changes else since or 0,
+        has_more=has_more
     )
 
 
-@router.get("/all", response_model=PaginatedResponse[TaskResponse])
-async def get_all_tasks(
-        page: int = Query(1, ge=1),
+@router.get("/search", response_model=PaginatedResponse[TaskResponse])
+async def search_tasks(
+        q: str = Query(..., min_length=1, max_length=200, description="Words to find in the title or description"),
         size: int = Query(10, ge=1, le=100),
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_read_db)
 ):
-    skip = (page - 1) * size
-    tasks = task_crud.get_all_tasks(db=db, skip=skip, limit=size)
-    total = task_crud.count_all_tasks(db=db)
-    total_pages = (total + size - 1) // size
+    """The user's tasks matching ``q``, best match first. Pages only by cursor, without totals."""
+    try:
+        after = decode_ranked_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        raise _invalid_cursor()
+    rows = await async_task_crud.search_user_tasks(db, current_user.id, q, limit=size + 1, after=after)
+    has_more = len(rows) > size
+    rows = rows[:size]
     return PaginatedResponse(
-        items=tasks,
-        total=total,
-        page=page,
-        pages=total_pages,
+        items=rows,
+        total=None,
+        page=1,
+        pages=None,
         size=size,
-        has_next=page < total_pages,
-        has_prev=page > 1
+        has_next=has_more,
+        has_prev=cursor is not None,
+        next_cursor=encode_cursor(rows[-1].id, score=rows[-1].score) if has_more else None
+    )
+
+
+@router.get("/stats", response_model=TaskStatsResponse)
+async def get_task_stats(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_read_db)
+):
+    """The user's task counts per status, archived tasks included, kept up to date by every write."""
+    etag = await _tasks_etag(db, current_user.id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+    counts = await async_task_crud.get_status_counts(db, current_user.id)
+    response.headers["ETag"] = etag
+    return TaskStatsResponse(counts=counts, total=sum(counts.values()))
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_task_events(current_user: User = Depends(get_current_user_async)):
+    """Server-sent events for the user's committed task writes.
+
+    Each event carries the write's revision as its id. A client that falls
+    behind gets an ``evicted`` event and is disconnected; after reconnecting it
+    catches up with /changes?since=<last id>. A ``reset`` event means events
+    may have been lost, e.g. while the worker's LISTEN connection was down,
+    and asks for the same catch-up.
+    """
+    async def events():
+        # subscribed only once streaming starts, so a response that never
+        # starts leaves nothing registered with the broker
+        with task_event_broker.subscribe(current_user.id) as subscription:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), settings.TASK_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    yield "event: evicted\ndata: {}\n\n"
+                    return
+                yield message
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/import", response_model=TaskImportReport)
+async def import_tasks(
+        file: UploadFile = File(...),
+        import_format: TaskFileFormat = Query(TaskFileFormat.NDJSON, alias="format"),
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        await run_in_threadpool(check_utf8, file.file)
+    except UnicodeDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File is not UTF-8 encoded: {e.reason}"
+        )
+    report = TaskImportReport()
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    chunks = validated_chunks(text, import_format, report)
+    start = time.perf_counter()
+    while True:
+        # parsing and validation are CPU bound, one chunk at a time off the event loop
+        chunk = await run_in_threadpool(next, chunks, None)
+        if chunk is None:
+            break
+        try:
+            report.imported += await async_task_crud.import_tasks(
+                db=db,
+                user_id=current_user.id,
+                tasks=[task for _, task in chunk]
+            )
+        except Exception as e:
+            record_failed_chunk(report, chunk, e)
+    return finish_report(report, time.perf_counter() - start)
+
+
+@router.post("/bulk", response_model=TaskBulkResponse, status_code=status.HTTP_201_CREATED)
+async def create_tasks_bulk(
+        payload: TaskBulkCreate,
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
+):
+    created_tasks, result = await async_task_crud.create_tasks(
+        db=db,
+        user_id=current_user.id,
+        tasks=[task.model_dump() for task in payload.items]
+    )
+    if result == TaskCRUDResult.VALIDATION_ERROR:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid task data"
+        )
+    return TaskBulkResponse(results=[
+        TaskBulkItemResult(id=task.id, result=result, task=TaskResponse.model_validate(task))
+        for task in created_tasks
+    ])
+
+
+@router.patch("/bulk", response_model=TaskBulkResponse)
+async def update_tasks_status_bulk(
+        payload: TaskBulkStatusUpdate,
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
+):
+    results = await async_task_crud.update_tasks_status(
+        db=db,
+        task_ids=payload.ids,
+        user_id=current_user.id,
+        status=payload.status
+    )
+    return TaskBulkResponse(results=[
+        TaskBulkItemResult(id=task_id, result=result, task=TaskResponse.model_validate(task) if task else None)
+        for task_id, task, result in results
+    ])
+
+
+@router.delete("/bulk", response_model=TaskBulkResponse)
+async def delete_tasks_bulk(
+        payload: TaskBulkDelete,
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
+):
+    results = await async_task_crud.delete_tasks(
+        db=db,
+        task_ids=payload.ids,
+        user_id=current_user.id
     )
+    return TaskBulkResponse(results=[
+        TaskBulkItemResult(id=task_id, result=result)
+        for task_id, result in results
+    ])
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
         task_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_read_db)
 ):
-    task = task_crud.get_task_by_id(db, task_id)
+    task = await async_task_crud.get_task_by_id(db, task_id)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -104,16 +429,21 @@ async def get_task(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
+    # compared only once the task is known to exist and be the user's
+    etag = await _tasks_etag(db, current_user.id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
     return task
 
 
 @router.post("/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 async def create_task(
         task: TaskCreate,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
-    created_task, result = task_crud.create_task(
+    created_task, result = await async_task_crud.create_task(
         db=db,
         title=task.title,
         user_id=current_user.id,
@@ -132,10 +462,10 @@ async def create_task(
 async def update_task(
         task_id: int,
         task_update: TaskUpdate,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
-    updated_task, result = task_crud.update_task(
+    updated_task, result = await async_task_crud.update_task(
         db=db,
         task_id=task_id,
         user_id=current_user.id,
@@ -159,10 +489,10 @@ async def update_task(
 @router.delete("/{task_id}")
 async def delete_task(
         task_id: int,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: User = Depends(get_current_user_async),
+        db: AsyncSession = Depends(get_async_db)
 ):
-    success, result = task_crud.delete_task(
+    success, result = await async_task_crud.delete_task(
         db=db,
         task_id=task_id,
         user_id=current_user.id
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from app.api.endpoints.tasks import router as tasks_router
 from app.api.endpoints.auth import router as auth_router
+from app.api.endpoints.internal import router as internal_router
 
 
 api_router = APIRouter()
@@ -10,6 +11,8 @@ api_router.include_router(auth_router,prefix="/auth",tags=["auth"])
 
 api_router.include_router(tasks_router,prefix="/tasks",tags=["tasks"])
 
+api_router.include_router(internal_router,prefix="/internal",tags=["internal"],include_in_schema=False)
+
 
 @api_router.get("/", summary="API root")
 def api_root():
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+from sqlalchemy import event, inspect
+from app.core.config import settings
+from app.users.models import User
+
+
+class PrincipalCache:
+    """Bounded LRU cache of verified access tokens to their user.
+
+    An entry lives at most ``ttl`` seconds and never past the token's ``exp``.
+    Cached users are detached from any session, only read their columns.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._tokens_by_username: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, token: str) -> Optional[User]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: User, token_expires_at: float) -> None:
+        if not self.enabled:
+            return
+        expires_at = min(time.time() + self.ttl, token_expires_at)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (expires_at, user)
+            self._tokens_by_username.setdefault(user.username, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, username: str) -> None:
+        with self._lock:
+            for token in list(self._tokens_by_username.get(username, ())):
+                self._remove(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_username.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        username = entry[1].username
+        tokens = self._tokens_by_username.get(username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_username[username]
+
+
+class SingleFlightCache:
+    """Runs concurrent calls with the same key once and shares the result.
+
+    With ``ttl`` > 0 results are also kept for that long, up to ``maxsize``
+    entries. Keys belong to a scope, ``invalidate(scope)`` drops its entries and
+    detaches calls in flight, so a caller never gets a result read before a
+    write it has seen committed. Results are shared, callers must not mutate them.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, single_flight: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.single_flight = single_flight
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[Hashable, asyncio.Future]] = {}
+        self._generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def caching(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    async def run(self, key: Hashable, scope: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.single_flight and not self.caching:
+            return await fn()
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                inflight = self._inflight.get(key) if self.single_flight else None
+                if inflight is None:
+                    self.misses += 1
+                    generation = self._generations.get(scope, 0)
+                    future = asyncio.get_running_loop().create_future()
+                    self._inflight[key] = (scope, future)
+                    break
+                self.coalesced += 1
+            future = inflight[1]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the leading caller was cancelled, run the query again
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # followers re-raise it, no "exception never retrieved" warning
+                future.exception()
+            raise
+        self._finish(key, future)
+        future.set_result(result)
+        if self.caching:
+            with self._lock:
+                if self._generations.get(scope, 0) == generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, scope, result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, *scopes: Hashable) -> None:
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            for key in [k for k, entry in self._entries.items() if entry[1] in scopes]:
+                del self._entries[key]
+            for key in [k for k, (scope, _) in self._inflight.items() if scope in scopes]:
+                del self._inflight[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> None:
+        with self._lock:
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+# Scoped by user id, None for queries over every user's tasks.
+task_query_cache = SingleFlightCache(
+    maxsize=settings.TASK_QUERY_CACHE_SIZE,
+    ttl=settings.TASK_QUERY_CACHE_TTL_SECONDS,
+    single_flight=settings.TASK_QUERY_SINGLE_FLIGHT,
+)
+
+
+# Evict on ORM deletes and credential changes. Other workers only drop their
+# entries when the TTL runs out, so keep PRINCIPAL_CACHE_TTL_SECONDS short.
+@event.listens_for(User, "after_delete")
+def _evict_deleted_user(mapper, connection, target: User) -> None:
+    principal_cache.invalidate_user(target.username)
+
+
+@event.listens_for(User, "after_update")
+def _evict_updated_user(mapper, connection, target: User) -> None:
+    state = inspect(target)
+    password = state.attrs.hashed_password.history
+    username = state.attrs.username.history
+    if password.has_changes() or username.has_changes():
+        for name in (*username.deleted, target.username):
+            principal_cache.invalidate_user(name)
@@ -1,7 +1,8 @@
 from __future__ import annotations
+import tempfile
 from pathlib import Path
 from datetime import timedelta
-from typing import List
+from typing import List, Literal, Optional
 from pydantic import SecretStr, Field, ConfigDict
 from pydantic_settings import BaseSettings
 
@@ -22,6 +23,74 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     DATABASE_URL: str
 
+    # connection pool of each engine, per process. The API only uses the async
+    # engine, keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under max_connections
+    DB_POOL_SIZE: int = Field(5, ge=1)
+    DB_MAX_OVERFLOW: int = Field(10, ge=0)
+    DB_POOL_TIMEOUT_SECONDS: float = Field(30, gt=0)
+    # connections older than this are replaced on checkout, -1 keeps them
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    # open DB_POOL_SIZE connections at startup instead of on the first requests
+    DB_POOL_WARMUP: bool = True
+    # PostgreSQL statement_timeout for every connection, 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = Field(0, ge=0)
+
+    # read replicas for the task GET endpoints, a JSON list of URLs. A user who
+    # wrote in the last DATABASE_REPLICA_STICKY_SECONDS reads from the primary;
+    # other workers know of the write only if TASK_EVENTS_BACKEND is "postgres"
+    DATABASE_REPLICA_URLS: List[str] = []
+    DATABASE_REPLICA_STICKY_SECONDS: float = Field(5, ge=0)
+    # replicas further behind, or unreachable, are skipped until they catch up
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = Field(5, ge=0)
+    DATABASE_REPLICA_CHECK_SECONDS: float = Field(5, gt=0)
+
+    # latency, SQL and serialization histograms served at /metrics
+    METRICS_ENABLED: bool = True
+    # requests slower than this are logged with the SQL they ran
+    SLOW_REQUEST_SECONDS: float = Field(1.0, gt=0)
+
+    # profile requests sent with X-Profile: 1 and X-Internal-Token into PROFILE_DIR
+    PROFILING_ENABLED: bool = False
+    PROFILE_DIR: Path = Path(tempfile.gettempdir()) / "todo-api-profiles"
+
+    # shared secret for /api/internal, sent as X-Internal-Token; unset disables it
+    INTERNAL_API_TOKEN: Optional[SecretStr] = None
+
+    # token -> user cache used by get_current_user, 0 disables it
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+
+    # identical concurrent task list/count queries share one execution; a TTL > 0
+    # also caches results until a write through TaskCRUD. Other workers only see
+    # the write on TTL expiry unless TASK_EVENTS_BACKEND is "postgres"
+    TASK_QUERY_SINGLE_FLIGHT: bool = True
+    TASK_QUERY_CACHE_SIZE: int = 1024
+    TASK_QUERY_CACHE_TTL_SECONDS: float = 0
+
+    # scripts/archive_tasks.py moves tasks completed this long ago out of the
+    # tasks table, in transactions of TASK_ARCHIVE_BATCH_SIZE tasks
+    TASK_ARCHIVE_AFTER_DAYS: float = Field(30, ge=0)
+    TASK_ARCHIVE_BATCH_SIZE: int = Field(1000, ge=1)
+    # it also prunes tombstones of deletes this old; /changes answers 410 to
+    # clients that last synced before them, which then sync again in full
+    TASK_TOMBSTONE_RETENTION_DAYS: float = Field(90, ge=0)
+
+    # bcrypt work factor, hashes with another cost are rehashed on login
+    BCRYPT_ROUNDS: int = Field(12, ge=4, le=31)
+    # threads reserved for hashing, also the limit on concurrent hashes
+    PASSWORD_HASH_WORKERS: int = Field(4, ge=1)
+
+    # orjson default responses, and list pages read as TASK_ROW_COLUMNS rows encoded straight to ORJSONResponse
+    FAST_JSON_RESPONSES: bool = False
+
+    # /api/tasks/stream fan-out: "memory" within one process, "postgres" through
+    # LISTEN/NOTIFY so every worker sees every commit
+    TASK_EVENTS_BACKEND: Literal["memory", "postgres"] = "memory"
+    # events queued per stream before a slow client is disconnected
+    TASK_EVENTS_QUEUE_SIZE: int = Field(100, ge=1)
+    TASK_EVENTS_HEARTBEAT_SECONDS: float = Field(15, gt=0)
+
     DEBUG: bool = False
     PROJECT_NAME: str = "Todo API"
     VERSION: str = "1.0.0"
@@ -1,10 +1,14 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db, route_reads
+from app.users.crud import async_user_crud
 from app.users.models import User
-from app.core.security import decode_access_token
+from app.core.cache import principal_cache
+from app.core.security import decode_access_token_claims, internal_token_valid
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -18,13 +22,65 @@ def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
     try:
-        username = decode_access_token(token)
+        claims = decode_access_token_claims(token)
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
+    user = db.query(User).filter(User.username == claims["sub"]).first()
     if not user:
         raise credentials_exception
 
+    # detached, so a rollback in this request cannot expire the cached instance
+    db.expunge(user)
+    principal_cache.put(token, user, claims["exp"])
     return user
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> User:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    try:
+        claims = decode_access_token_claims(token)
+    except JWTError:
+        raise credentials_exception
+
+    user = await async_user_crud.get_user_by_username(db, claims["sub"])
+    if not user:
+        raise credentials_exception
+
+    # detached, so a rollback in this request cannot expire the cached instance
+    db.expunge(user)
+    principal_cache.put(token, user, claims["exp"])
+    return user
+
+
+async def get_async_read_db(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> AsyncSession:
+    """get_async_db for endpoints that only read, served by a replica when DATABASE_REPLICA_URLS is set.
+
+    The request's one session, shared with get_current_user_async: a second
+    one would make every request wait for two pooled connections.
+    """
+    await route_reads(db, current_user.id)
+    return db
+
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)) -> None:
+    """Guard for /api/internal, which answers 404 unless INTERNAL_API_TOKEN is set and sent."""
+    if not internal_token_valid(x_internal_token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
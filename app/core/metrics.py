@@ -0,0 +1,212 @@
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# statements kept per request for the slow request log
+MAX_CAPTURED_STATEMENTS = 50
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus histogram, one series per label value tuple."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in sorted(self._series.items())]
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REGISTRY: List[Histogram] = []
+# callables returning extra exposition lines, evaluated on every scrape
+COLLECTORS: List[Callable[[], List[str]]] = []
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route and status.", ("method", "route", "status"))
+REQUEST_DB_STATEMENTS = Histogram("http_request_db_statements", "SQL statements executed per request.", ("route",), STATEMENT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing SQL per request.", ("route",))
+SERIALIZE_SECONDS = Histogram("http_response_serialize_seconds", "Time from the endpoint returning to the response starting.", ("route",))
+PASSWORD_HASH_SECONDS = Histogram("password_hash_seconds", "bcrypt hash and verify time, including the executor queue.", ("operation",))
+JWT_DECODE_SECONDS = Histogram("jwt_decode_seconds", "Access token decode and signature check time.", buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "captured", "endpoint_returned_at", "serialize_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.captured: List[Tuple[float, str]] = []
+        self.endpoint_returned_at: Optional[float] = None
+        self.serialize_seconds: Optional[float] = None
+
+    def record_statement(self, statement: str, seconds: float) -> None:
+        self.statements += 1
+        self.db_seconds += seconds
+        if len(self.captured) < MAX_CAPTURED_STATEMENTS:
+            self.captured.append((seconds, statement))
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute the engine's statements to the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        stats = request_stats.get()
+        if stats is not None:
+            stats.record_statement(statement, elapsed)
+
+
+class InstrumentedRoute(APIRoute):
+    """Notes when the endpoint returns, so MetricsMiddleware can time serialization."""
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def marked(*args, **kwargs):
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    _mark_endpoint_returned()
+        else:
+            @functools.wraps(call)
+            def marked(*args, **kwargs):
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    _mark_endpoint_returned()
+        self.dependant.call = marked
+        return super().get_route_handler()
+
+
+def _mark_endpoint_returned() -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.endpoint_returned_at = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """Records per-route latency, SQL and serialization histograms, and logs slow requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if stats.endpoint_returned_at is not None:
+                    stats.serialize_seconds = time.perf_counter() - stats.endpoint_returned_at
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_stats.reset(token)
+            self._record(scope, stats, status_code, time.perf_counter() - start)
+
+    def _record(self, scope, stats: RequestStats, status_code: int, seconds: float) -> None:
+        route = scope.get("route")
+        # unmatched paths share one label, so scans cannot blow up the series count
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.observe(seconds, scope["method"], path, str(status_code))
+        REQUEST_DB_STATEMENTS.observe(stats.statements, path)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, path)
+        if stats.serialize_seconds is not None:
+            SERIALIZE_SECONDS.observe(stats.serialize_seconds, path)
+        if seconds >= settings.SLOW_REQUEST_SECONDS:
+            statements = "\n".join(f"  [{elapsed * 1000:.1f} ms] {statement}" for elapsed, statement in stats.captured)
+            logger.warning(
+                "Slow request %s %s -> %d in %.3f s, %d statements in %.3f s, serialization %s\n%s",
+                scope["method"], path, status_code, seconds, stats.statements, stats.db_seconds,
+                f"{stats.serialize_seconds:.3f} s" if stats.serialize_seconds is not None else "n/a",
+                statements,
+            )
@@ -0,0 +1,35 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+
+def encode_cursor(last_id: int, score: Optional[float] = None) -> str:
+    position = {"id": last_id} if score is None else {"id": last_id, "score": score}
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = position["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise ValueError("Malformed cursor")
+    return position
+
+
+def decode_cursor(cursor: str) -> int:
+    return _decode(cursor)["id"]
+
+
+def decode_ranked_cursor(cursor: str) -> Tuple[float, int]:
+    """(score, id) of the last result of a page ordered by score, then id."""
+    position = _decode(cursor)
+    score = position.get("score")
+    if not isinstance(score, (int, float)) or isinstance(score, bool):
+        raise ValueError("Malformed cursor")
+    return float(score), position["id"]
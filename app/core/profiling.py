@@ -0,0 +1,68 @@
+import cProfile
+import io
+import logging
+import pstats
+import re
+import threading
+import time
+from pathlib import Path
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.security import internal_token_valid
+
+# cProfile allows one active profiler per process
+_profiler_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """Profiles single requests sent with ``X-Profile: 1`` and a valid X-Internal-Token.
+
+    The profile is written as a cProfile ``.prof`` file to ``directory``, its
+    name is returned in the X-Profile-File header and the top functions are
+    logged. It covers the handler, dependencies, SQLAlchemy and serialization
+    on the event loop thread, along with whatever else that thread runs
+    meanwhile, so profile on a quiet worker. Work handed to other threads, like
+    bcrypt, only shows up as waiting. While a profile runs, other requests
+    asking for one are served unprofiled.
+    """
+
+    def __init__(self, app, directory: Path, top: int = 25):
+        self.app = app
+        self.directory = Path(directory)
+        self.top = top
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope) or not _profiler_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            _profiler_lock.release()
+
+    def _requested(self, scope) -> bool:
+        headers = Headers(scope=scope)
+        return headers.get("x-profile") == "1" and internal_token_valid(headers.get("x-internal-token"))
+
+    async def _profile(self, scope, receive, send):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        now = time.time()
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}-{scope['method']}-{slug}.prof"
+
+        async def send_with_profile_name(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-File", name)
+            await send(message)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_name)
+        finally:
+            profiler.disable()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(self.directory / name)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(self.top)
+            logger.info("Profiled %s %s into %s\n%s", scope["method"], scope["path"], self.directory / name, summary.getvalue())
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One consumer's bounded queue, read with ``await subscription.get()``.
+
+    ``get`` returns None once the subscription was evicted for falling behind.
+    """
+
+    def __init__(self, broker: "Broker", channel: Hashable, maxsize: int):
+        self.broker = broker
+        self.channel = channel
+        self.evicted = False
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize)
+
+    async def get(self) -> Optional[str]:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Broker:
+    """In-process fan-out of messages to the subscribers of a channel.
+
+    ``publish`` may be called from any thread, delivery happens on each
+    subscriber's event loop. A subscriber whose queue is full is evicted
+    instead of slowing down publishers or buffering without bound.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.published = 0
+        self.evictions = 0
+        self._subscribers: Dict[Hashable, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: Hashable) -> Subscription:
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel: Hashable, message: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, message)
+            except RuntimeError:
+                # the subscriber's loop is closed
+                self.unsubscribe(subscription)
+
+    def broadcast(self, message: str) -> None:
+        """Publish ``message`` on every channel that has subscribers."""
+        with self._lock:
+            channels = list(self._subscribers)
+        for channel in channels:
+            self.publish(channel, message)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscribers = sum(len(s) for s in self._subscribers.values())
+        return {"subscribers": subscribers, "published": self.published, "evictions": self.evictions}
+
+    def _deliver(self, subscription: Subscription, message: str) -> None:
+        if subscription.evicted:
+            return
+        try:
+            subscription.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Evicting slow subscriber of %r after %d queued messages", subscription.channel, self.queue_size)
+            subscription.evicted = True
+            self.evictions += 1
+            self.unsubscribe(subscription)
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(None)
+
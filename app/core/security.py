@@ -1,10 +1,28 @@
+import asyncio
+import hmac
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_SECONDS, JWT_DECODE_SECONDS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min and max pin the cost, so a hash made with any other cost needs an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL, so threads hash in parallel without starving the
+# default threadpool that runs sync endpoints and dependencies
+password_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -12,6 +30,20 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Return whether the password matches and, if its cost is outdated, a new hash."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    with PASSWORD_HASH_SECONDS.time("hash"):
+        return await loop.run_in_executor(password_hash_executor, get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    with PASSWORD_HASH_SECONDS.time("verify"):
+        return await loop.run_in_executor(password_hash_executor, verify_and_update_password, plain_password, hashed_password)
+
 def create_access_token(subject: str,expires_delta: Optional[timedelta] = None,) -> str:
     now = datetime.utcnow()
     expire = now + (expires_delta if expires_delta is not None else settings.access_token_expire_delta)
@@ -23,9 +55,19 @@ def create_access_token(subject: str,expires_delta: Optional[timedelta] = None,)
     token = jwt.encode(to_encode, settings.get_secret_key(), algorithm=settings.ALGORITHM)
     return token
 
-def decode_access_token(token: str) -> str:
-    payload = jwt.decode(token, settings.get_secret_key(), algorithms=[settings.ALGORITHM])
-    username = payload.get("sub")
-    if not username:
+def decode_access_token_claims(token: str) -> dict:
+    with JWT_DECODE_SECONDS.time():
+        payload = jwt.decode(token, settings.get_secret_key(), algorithms=[settings.ALGORITHM])
+    if not payload.get("sub"):
         raise JWTError("Missing subject")
-    return username
+    return payload
+
+def decode_access_token(token: str) -> str:
+    return decode_access_token_claims(token)["sub"]
+
+def internal_token_valid(token: Optional[str]) -> bool:
+    """Whether ``token`` matches INTERNAL_API_TOKEN, always False while it is unset."""
+    expected = settings.INTERNAL_API_TOKEN
+    if expected is None or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), expected.get_secret_value().encode())
@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import Select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+REPLICA_KEY = "replica"
+# users remembered as recent writers before expired entries are pruned
+MAX_TRACKED_WRITERS = 10000
+
+# seconds the replica is behind, 0 while it has replayed everything it received
+POSTGRES_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingSession(Session):
+    """Sends plain SELECTs to the replica in ``info["replica"]``, the rest to the primary.
+
+    Flushes, DML, SELECT ... FOR UPDATE and text() statements go to the
+    session's own bind, the primary. After the first of them the session
+    forgets its replica, so it reads its own writes. Without a replica it is
+    a plain Session.
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        replica = self.info.get(REPLICA_KEY)
+        if replica is not None:
+            if not self._flushing and isinstance(clause, Select) and clause._for_update_arg is None:
+                return replica.sync_engine
+            self.info[REPLICA_KEY] = None
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+class ReplicaRouter:
+    """Picks the replica for a read, round robin over those in sync.
+
+    Users who wrote in the last ``sticky_seconds`` read from the primary, so
+    they see their writes before the replicas replay them. check_lag() drops
+    replicas more than ``max_lag_seconds`` behind, or unreachable, until they
+    catch up; with none left reads fall back to the primary.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], sticky_seconds: float, max_lag_seconds: float):
+        self.engines = engines
+        self.sticky_seconds = sticky_seconds
+        self.max_lag_seconds = max_lag_seconds
+        # None for a replica that could not be reached
+        self.lag: List[Optional[float]] = [0.0] * len(engines)
+        self._in_sync = list(engines)
+        self._turn = itertools.count()
+        self._written_at: Dict[int, float] = {}
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def note_write(self, user_id: int) -> None:
+        now = time.monotonic()
+        if len(self._written_at) >= MAX_TRACKED_WRITERS:
+            self._written_at = {uid: at for uid, at in self._written_at.items() if now - at < self.sticky_seconds}
+        self._written_at[user_id] = now
+
+    def reader(self, user_id: Optional[int] = None) -> Optional[AsyncEngine]:
+        """The replica for a read by ``user_id``, None for the primary."""
+        in_sync = self._in_sync
+        written_at = self._written_at.get(user_id)
+        if not in_sync or (written_at is not None and time.monotonic() - written_at < self.sticky_seconds):
+            if self.engines:
+                self.primary_reads += 1
+            return None
+        self.replica_reads += 1
+        return in_sync[next(self._turn) % len(in_sync)]
+
+    async def check_lag(self) -> None:
+        for index, engine in enumerate(self.engines):
+            try:
+                self.lag[index] = await replica_lag(engine)
+            except Exception:
+                logger.warning("Replica %s unreachable, reading from the others", index, exc_info=True)
+                self.lag[index] = None
+        self._in_sync = [
+            engine for engine, lag in zip(self.engines, self.lag)
+            if lag is not None and lag <= self.max_lag_seconds
+        ]
+
+    async def monitor(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_lag()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.engines),
+            "in_sync": len(self._in_sync),
+            "lag_seconds": self.lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
+
+
+async def replica_lag(engine: AsyncEngine) -> float:
+    async with engine.connect() as connection:
+        if engine.dialect.name != "postgresql":
+            # no replication to measure, only check the database answers
+            await connection.execute(text("SELECT 1"))
+            return 0.0
+        return float(await connection.scalar(POSTGRES_LAG))
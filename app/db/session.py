@@ -1,19 +1,176 @@
-from sqlalchemy import create_engine
+import time
+from typing import Optional, Sequence, Type
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, Pool
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.db.routing import REPLICA_KEY, ReplicaRouter, RoutingSession
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class _TimedCheckout:
+    """Records how long checkouts wait for a free connection."""
+    checkouts = 0
+    timeouts = 0
+    wait_seconds_total = 0.0
+    wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, asynchronous: bool = False) -> dict:
+    """Pool and connection options from Settings for a sync or async engine."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # SQLite picks its own pool per database kind
+        return {}
+    options = dict(
+        poolclass=TimedAsyncQueuePool if asynchronous else TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    if backend == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if asynchronous:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+def pool_status(pool: Pool) -> dict:
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, _TimedCheckout):
+        status.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_seconds_total=round(pool.wait_seconds_total, 6),
+            wait_seconds_max=round(pool.wait_seconds_max, 6),
+        )
+    return status
 
-engine = create_engine(settings.DATABASE_URL, future=True)
 
 SessionLocal = sessionmaker(
-    bind=engine,
     autoflush=False,
     autocommit=False,
     future=True,
 )
 
+# sessions opened with info={"replica": engine} read from that replica
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False,
+    sync_session_class=RoutingSession,
+)
+
+engine: Engine
+async_engine: AsyncEngine
+replica_router: ReplicaRouter
+
+
+def configure_database(url: str, async_poolclass: Optional[Type[Pool]] = None, replica_urls: Sequence[str] = ()) -> None:
+    """Build the engines for ``url`` and bind SessionLocal and AsyncSessionLocal to them.
+
+    Runs at import for DATABASE_URL and DATABASE_REPLICA_URLS. Tests and
+    scripts call it again to point the application at another database, e.g.
+    an in-memory SQLite one, and read the engines as ``session.engine``
+    afterwards. ``async_poolclass`` replaces the pool configured from Settings.
+    """
+    global engine, async_engine, replica_router
+    engine = create_engine(url, future=True, **engine_options(url))
+    async_options = engine_options(url, asynchronous=True) if async_poolclass is None else {"poolclass": async_poolclass}
+    async_engine = create_async_engine(to_async_url(url), **async_options)
+    replica_engines = [
+        create_async_engine(to_async_url(replica_url), **engine_options(replica_url, asynchronous=True))
+        for replica_url in replica_urls
+    ]
+    if settings.METRICS_ENABLED:
+        for instrumented in [engine, async_engine.sync_engine] + [replica.sync_engine for replica in replica_engines]:
+            instrument_engine(instrumented)
+    replica_router = ReplicaRouter(
+        replica_engines,
+        sticky_seconds=settings.DATABASE_REPLICA_STICKY_SECONDS,
+        max_lag_seconds=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+    )
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+
+
+configure_database(settings.DATABASE_URL, replica_urls=settings.DATABASE_REPLICA_URLS)
+
 def get_db():
     db: Session = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def route_reads(db: AsyncSession, user_id: Optional[int] = None) -> None:
+    """Send ``db``'s SELECTs to a replica, unless ``user_id`` just wrote or none is in sync.
+
+    Ends the session's open transaction first, e.g. the current user's
+    lookup, so the request does not hold a primary connection while it reads.
+    """
+    replica = replica_router.reader(user_id)
+    if replica is not None:
+        await db.commit()
+        db.info[REPLICA_KEY] = replica
+
+def get_async_session_factory() -> async_sessionmaker:
+    """For responses that outlive the request scope, e.g. streaming, and open their own session."""
+    return AsyncSessionLocal
+
+async def warm_up_pool(engine: AsyncEngine, connections: int) -> None:
+    """Open ``connections`` connections and return them to the pool."""
+    opened = [await engine.connect() for _ in range(connections)]
+    for connection in opened:
+        await connection.close()
@@ -1,10 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.api.endpoints.internal import metrics_router
 from app.api.router import api_router
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.db import session
+from app.db.session import warm_up_pool
+from app.tasks.events import TaskEventListener
 
-app = FastAPI(title="ToDo API", version="1.0.0",)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_POOL_WARMUP:
+        await warm_up_pool(session.async_engine, settings.DB_POOL_SIZE)
+    listener = None
+    if settings.TASK_EVENTS_BACKEND == "postgres":
+        listener = TaskEventListener(settings.DATABASE_URL)
+        await listener.start()
+    monitor = None
+    if session.replica_router.engines:
+        await session.replica_router.check_lag()
+        monitor = asyncio.create_task(session.replica_router.monitor(settings.DATABASE_REPLICA_CHECK_SECONDS))
+    yield
+    if monitor is not None:
+        monitor.cancel()
+    if listener is not None:
+        await listener.stop()
+    await session.async_engine.dispose()
+    for replica in session.replica_router.engines:
+        await replica.dispose()
+
+
+app = FastAPI(
+    title="ToDo API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse if settings.FAST_JSON_RESPONSES else JSONResponse,
+    lifespan=lifespan,
+)
 
 app.include_router(api_router, prefix="/api")
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
+
+if settings.PROFILING_ENABLED:
+    # requests without X-Profile only pay for one header lookup
+    app.add_middleware(ProfilingMiddleware, directory=settings.PROFILE_DIR)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
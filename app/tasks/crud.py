@@ -1,46 +1,199 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Tuple
-from app.tasks.models import Task, TaskStatus
-from app.tasks.schemas import TaskCRUDResult
+import csv
+import io
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import func, select, insert, update, delete, union_all, or_, and_, literal_column, table, column, Select, Row, Result
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Tuple, Iterable, AsyncIterator, Sequence
+from app.tasks.models import Task, TaskTombstone, ArchivedTask, TaskStatus, TaskStatusCount, SEARCH_CONFIG
+from app.core.cache import task_query_cache
+from app.tasks.events import record_task_event
+from app.tasks.schemas import TaskCRUDResult, TaskEventType
+from app.users.models import User
 from sqlalchemy.exc import IntegrityError
 
+IMPORT_COLUMNS = ("title", "description", "status", "user_id", "revision", "completed_at")
+# TaskResponse fields, in order, for list queries that skip ORM hydration
+TASK_ROW_COLUMNS = (Task.title, Task.description, Task.status, Task.id, Task.user_id)
+# columns copied from tasks to archived_tasks
+ARCHIVE_COLUMNS = ("id", "title", "description", "status", "user_id", "revision", "completed_at")
+
+
+# FTS5 table of the SQLite stand-in for the PostgreSQL search_vector column
+tasks_fts = table("tasks_fts", column("rowid"), column("rank"))
+
+
+def completed_at(status: TaskStatus) -> Optional[datetime]:
+    return datetime.now(timezone.utc) if status == TaskStatus.COMPLETED else None
+
 class TaskCRUD:
 
-    def get_all_tasks(self, db: Session, skip: int = 0, limit: int = 100) -> List[Task]:
-        return db.query(Task).offset(skip).limit(limit).all()
+    def _list_query(self, db: Session, as_rows: bool, fields: Optional[Sequence[str]]):
+        if as_rows:
+            columns = [c for c in TASK_ROW_COLUMNS if fields is None or c.key == "id" or c.key in fields]
+            return db.query(*columns)
+        query = db.query(Task)
+        if fields is not None:
+            query = query.options(load_only(Task.id, *(getattr(Task, f) for f in fields)))
+        return query
+
+    def get_all_tasks(self, db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, as_rows: bool = False, fields: Optional[Sequence[str]] = None) -> List[Task]:
+        query = self._list_query(db, as_rows, fields)
+        if after_id is not None:
+            query = query.filter(Task.id > after_id)
+        return query.order_by(Task.id).offset(skip).limit(limit).all()
+
+    def get_user_tasks(self, db: Session, user_id: int, status: Optional[TaskStatus] = None, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, as_rows: bool = False, fields: Optional[Sequence[str]] = None,
+                       include_archived: bool = False):
+        """With as_rows=True return Row tuples of TASK_ROW_COLUMNS instead of Task entities.
 
-    def get_user_tasks(self, db: Session, user_id: int, status: Optional[TaskStatus] = None, skip: int = 0, limit: int = 100):
-        query = db.query(Task).filter(Task.user_id == user_id)
+        fields limits the loaded columns to id plus the given names, the rest are deferred.
+        include_archived merges in archived_tasks and always returns rows.
+        """
+        if include_archived:
+            return self._with_archived(db, user_id, status, skip, limit, after_id, fields)
+        query = self._list_query(db, as_rows, fields)
+        query = query.filter(Task.user_id == user_id)
         if status is not None:
             query = query.filter(Task.status == status)
-        return query.offset(skip).limit(limit).all()
+        if after_id is not None:
+            query = query.filter(Task.id > after_id)
+        return query.order_by(Task.id).offset(skip).limit(limit).all()
+
+    def _with_archived(self, db: Session, user_id: int, status: Optional[TaskStatus], skip: int, limit: int,
+                       after_id: Optional[int], fields: Optional[Sequence[str]]) -> List[Row]:
+        def part(model):
+            columns = [getattr(model, c.key) for c in TASK_ROW_COLUMNS if fields is None or c.key == "id" or c.key in fields]
+            query = select(*columns).where(model.user_id == user_id)
+            if status is not None:
+                query = query.where(model.status == status)
+            if after_id is not None:
+                query = query.where(model.id > after_id)
+            return query
+        # ids are unique across both tables; PostgreSQL merges the two (user_id, id) index scans
+        tasks = union_all(part(Task), part(ArchivedTask)).subquery()
+        return db.execute(select(tasks).order_by(tasks.c.id).offset(skip).limit(limit)).all()
+
+    def search_user_tasks(self, db: Session, user_id: int, query: str, limit: int = 10,
+                          after: Optional[Tuple[float, int]] = None) -> List[Row]:
+        """Rows of TASK_ROW_COLUMNS plus ``score`` whose title or description match ``query``.
+
+        Best match first, ties by id; ``after`` is the (score, id) of the last
+        row of the previous page. PostgreSQL reads ``query`` as websearch syntax,
+        with quoted phrases, OR and -word; the SQLite stand-in matches all of
+        its words. Archived tasks are not searched.
+        """
+        if db.bind.dialect.name == "postgresql":
+            vector = literal_column(f"{Task.__tablename__}.search_vector")
+            tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+            matches = select(*TASK_ROW_COLUMNS, func.ts_rank_cd(vector, tsquery).label("score")).where(
+                Task.user_id == user_id, vector.op("@@")(tsquery)
+            )
+        else:
+            words = re.findall(r"\w+", query)
+            if not words:
+                return []
+            terms = " ".join('"' + word + '"' for word in words)
+            # bm25 is lower for better matches
+            matches = select(*TASK_ROW_COLUMNS, (-tasks_fts.c.rank).label("score")).join(
+                tasks_fts, tasks_fts.c.rowid == Task.id
+            ).where(Task.user_id == user_id, literal_column("tasks_fts").op("MATCH")(terms))
+        ranked = matches.subquery()
+        page = select(ranked).order_by(ranked.c.score.desc(), ranked.c.id).limit(limit)
+        if after is not None:
+            score, last_id = after
+            page = page.where(or_(ranked.c.score < score, and_(ranked.c.score == score, ranked.c.id > last_id)))
+        return db.execute(page).all()
 
     def get_task_by_id(self, db: Session, task_id: int) -> Optional[Task]:
-        return db.get(Task, task_id)
+        return db.get(Task, task_id) or db.get(ArchivedTask, task_id)
+
+    def export_query(self, user_id: int, status: Optional[TaskStatus] = None, include_archived: bool = False) -> Select:
+        # plain columns, so exported rows skip ORM hydration and the identity map
+        def part(model):
+            query = select(model.id, model.title, model.description, model.status, model.user_id).where(model.user_id == user_id)
+            if status is not None:
+                query = query.where(model.status == status)
+            return query
+        if not include_archived:
+            return part(Task).order_by(Task.id)
+        tasks = union_all(part(Task), part(ArchivedTask)).subquery()
+        return select(tasks).order_by(tasks.c.id)
 
     def get_tasks_by_status(self, db: Session, status: TaskStatus, skip: int = 0, limit: int = 100) -> List[Task]:
-        return db.query(Task).filter(Task.status == status).offset(skip).limit(limit).all()
+        return db.query(Task).filter(Task.status == status).order_by(Task.id).offset(skip).limit(limit).all()
 
-    def count_user_tasks(self, db: Session, user_id: int, status: Optional[TaskStatus] = None) -> int:
-        query = db.query(Task).filter(Task.user_id == user_id)
-        if status is not None:
-            query = query.filter(Task.status == status)
-        return query.count()
+    def get_task_changes(self, db: Session, user_id: int, since: Optional[int] = None, limit: int = 500) -> Tuple[List[Tuple[int, int, Optional[Task]]], bool]:
+        """Tasks written and deleted after revision ``since``, oldest first.
+
+        Returns (revision, task_id, task) triples, task is None for a delete, and
+        whether more changes follow. One write shares a revision across its rows,
+        so a page never ends inside a revision: the next ``since`` is the last
+        revision returned. since=None starts from the beginning.
+        """
+        changes = self._changes(db, user_id, since=since, limit=limit + 1)
+        if len(changes) <= limit:
+            return changes, False
+        boundary = changes[limit][0]
+        page = [change for change in changes[:limit] if change[0] != boundary]
+        if not page:
+            # a single write larger than the page is returned whole
+            page = self._changes(db, user_id, revision=boundary)
+        return page, True
+
+    def _changes(self, db: Session, user_id: int, since: Optional[int] = None, limit: Optional[int] = None,
+                 revision: Optional[int] = None) -> List[Tuple[int, int, Optional[Task]]]:
+        tombstones = select(TaskTombstone.revision, TaskTombstone.task_id).where(TaskTombstone.user_id == user_id)
+        if revision is not None:
+            tombstones = tombstones.where(TaskTombstone.revision == revision)
+        elif since is not None:
+            tombstones = tombstones.where(TaskTombstone.revision > since)
+        tombstones = tombstones.order_by(TaskTombstone.revision, TaskTombstone.task_id).limit(limit)
+        changes = [(rev, task_id, None) for rev, task_id in db.execute(tombstones)]
+        # archived tasks keep their revision, so they are still part of a full sync
+        for model in (Task, ArchivedTask):
+            tasks = select(model).where(model.user_id == user_id)
+            if revision is not None:
+                tasks = tasks.where(model.revision == revision)
+            elif since is not None:
+                tasks = tasks.where(model.revision > since)
+            tasks = tasks.order_by(model.revision, model.id).limit(limit)
+            changes += [(task.revision, task.id, task) for task in db.scalars(tasks)]
+        # each side is sorted and limited, so the merged head is exact
+        changes.sort(key=lambda change: change[:2])
+        return changes[:limit]
+
+    def count_user_tasks(self, db: Session, user_id: int, status: Optional[TaskStatus] = None, include_archived: bool = False) -> int:
+        count = 0
+        for model in (Task, ArchivedTask) if include_archived else (Task,):
+            # plain COUNT instead of Query.count(), which wraps the query in a subquery
+            query = db.query(func.count(model.id)).filter(model.user_id == user_id)
+            if status is not None:
+                query = query.filter(model.status == status)
+            count += query.scalar()
+        return count
 
     def count_all_tasks(self, db: Session) -> int:
-        return db.query(Task).count()
+        return db.query(func.count(Task.id)).scalar()
 
     def create_task(self, db: Session, title: str, user_id: int, description: Optional[str] = None, status: TaskStatus = TaskStatus.NEW) -> Tuple[Optional[Task], TaskCRUDResult]:
-        db_task = Task(
-            title=title,
-            description=description,
-            status=status,
-            user_id=user_id
-        )
         try:
-            db.add(db_task)
+            revision = self.bump_task_version(db, user_id)
+            if revision is None:
+                db.rollback()
+                return None, TaskCRUDResult.NOT_FOUND
+            db_task = db.scalars(
+                insert(Task)
+                .values(title=title, description=description, status=status, user_id=user_id, revision=revision,
+                        completed_at=completed_at(status))
+                .returning(Task)
+            ).one()
+            self.adjust_status_counts(db, user_id, added=[status])
+            record_task_event(db, user_id, TaskEventType.CREATED, revision, [db_task.id])
             db.commit()
-            db.refresh(db_task)
             return db_task, TaskCRUDResult.SUCCESS
         except IntegrityError as e:
             db.rollback()
@@ -54,39 +207,476 @@ class TaskCRUD:
             raise
 
     def update_task(self, db: Session, task_id: int, user_id: int, title: Optional[str] = None, description: Optional[str] = None, status: Optional[TaskStatus] = None,) -> Tuple[Optional[Task], TaskCRUDResult]:
-
-        task = db.get(Task, task_id)
-
-        if not task:
-            return None, TaskCRUDResult.NOT_FOUND
-        if task.user_id != user_id:
-            return None, TaskCRUDResult.ACCESS_DENIED
+        values = {}
         if title is not None:
-            task.title = title
+            values["title"] = title
         if description is not None:
-            task.description = description
+            values["description"] = description
         if status is not None:
-            task.status = status
+            values["status"] = status
+            values["completed_at"] = completed_at(status)
+        owned = (Task.id == task_id, Task.user_id == user_id)
         try:
+            if values:
+                values["revision"] = self.bump_task_version(db, user_id)
+                updated = self._update_returning_old(db, owned, values)
+                if not updated and self._unarchive(db, user_id, [task_id]):
+                    # an archived task goes back to tasks before it is written
+                    updated = self._update_returning_old(db, owned, values)
+                task, old_status = updated[0] if updated else (None, None)
+            else:
+                task = db.scalars(select(Task).where(*owned)).first() or db.scalars(
+                    select(ArchivedTask).where(ArchivedTask.id == task_id, ArchivedTask.user_id == user_id)
+                ).first()
+            if task is None:
+                # undo the version bump
+                db.rollback()
+                return None, self._missing_results(db, [task_id])[task_id]
+            if values:
+                if status is not None:
+                    self.adjust_status_counts(db, user_id, added=[status], removed=[old_status])
+                record_task_event(db, user_id, self._update_event(status), task.revision, [task.id])
             db.commit()
-            db.refresh(task)
             return task, TaskCRUDResult.SUCCESS
         except Exception:
             db.rollback()
             raise
 
     def delete_task(self, db: Session, task_id: int, user_id: int) -> Tuple[bool, TaskCRUDResult]:
-        task = db.get(Task, task_id)
-        if not task:
-            return False, TaskCRUDResult.NOT_FOUND
-        if task.user_id != user_id:
-            return False, TaskCRUDResult.ACCESS_DENIED
         try:
-            db.delete(task)
+            revision = self.bump_task_version(db, user_id)
+            deleted = db.execute(
+                delete(Task)
+                .where(Task.id == task_id, Task.user_id == user_id)
+                .returning(Task.id, Task.status)
+            ).first() or self._delete_archived(db, user_id, [task_id]).first()
+            if deleted is None:
+                db.rollback()
+                return False, self._missing_results(db, [task_id])[task_id]
+            deleted, deleted_status = deleted
+            self.adjust_status_counts(db, user_id, removed=[deleted_status])
+            self._add_tombstones(db, user_id, [deleted], revision)
+            record_task_event(db, user_id, TaskEventType.DELETED, revision, [deleted])
             db.commit()
             return True, TaskCRUDResult.SUCCESS
         except Exception:
             db.rollback()
             raise
 
-task_crud = TaskCRUD()
\ No newline at end of file
+    def create_tasks(self, db: Session, user_id: int, tasks: Iterable[dict]) -> Tuple[List[Task], TaskCRUDResult]:
+        try:
+            revision = self.bump_task_version(db, user_id)
+            if revision is None:
+                db.rollback()
+                return [], TaskCRUDResult.NOT_FOUND
+            rows = [
+                {"title": t["title"], "description": t.get("description"), "status": t.get("status", TaskStatus.NEW),
+                 "user_id": user_id, "revision": revision, "completed_at": completed_at(t.get("status"))}
+                for t in tasks
+            ]
+            created = db.scalars(insert(Task).returning(Task, sort_by_parameter_order=True), rows).all()
+            self.adjust_status_counts(db, user_id, added=[row["status"] for row in rows])
+            record_task_event(db, user_id, TaskEventType.CREATED, revision, [task.id for task in created])
+            db.commit()
+            return created, TaskCRUDResult.SUCCESS
+        except IntegrityError:
+            db.rollback()
+            return [], TaskCRUDResult.VALIDATION_ERROR
+        except Exception:
+            db.rollback()
+            raise
+
+    def update_tasks_status(self, db: Session, task_ids: Iterable[int], user_id: int, status: TaskStatus) -> List[Tuple[int, Optional[Task], TaskCRUDResult]]:
+        ids = list(dict.fromkeys(task_ids))
+        try:
+            revision = self.bump_task_version(db, user_id)
+            values = {"status": status, "revision": revision, "completed_at": completed_at(status)}
+            updated = self._update_returning_old(db, (Task.id.in_(ids), Task.user_id == user_id), values)
+            by_id = {task.id: task for task, _ in updated}
+            old_statuses = {task.id: old for task, old in updated}
+            restored = self._unarchive(db, user_id, [i for i in ids if i not in by_id])
+            if restored:
+                old_statuses.update(restored)
+                by_id.update((task.id, task) for task, _ in self._update_returning_old(
+                    db, (Task.id.in_(restored), Task.user_id == user_id), values
+                ))
+            missing = self._missing_results(db, [i for i in ids if i not in by_id])
+            if by_id:
+                self.adjust_status_counts(db, user_id, added=[status] * len(by_id), removed=[old_statuses[i] for i in by_id])
+                record_task_event(db, user_id, self._update_event(status), revision, by_id)
+                db.commit()
+            else:
+                db.rollback()
+        except Exception:
+            db.rollback()
+            raise
+        return [
+            (i, by_id[i], TaskCRUDResult.SUCCESS) if i in by_id else (i, None, missing[i])
+            for i in ids
+        ]
+
+    def delete_tasks(self, db: Session, task_ids: Iterable[int], user_id: int) -> List[Tuple[int, TaskCRUDResult]]:
+        ids = list(dict.fromkeys(task_ids))
+        try:
+            revision = self.bump_task_version(db, user_id)
+            deleted_statuses = dict(db.execute(
+                delete(Task)
+                .where(Task.id.in_(ids), Task.user_id == user_id)
+                .returning(Task.id, Task.status)
+            ).all())
+            not_in_tasks = [i for i in ids if i not in deleted_statuses]
+            if not_in_tasks:
+                deleted_statuses.update(self._delete_archived(db, user_id, not_in_tasks).all())
+            deleted = set(deleted_statuses)
+            missing = self._missing_results(db, [i for i in ids if i not in deleted])
+            if deleted:
+                self.adjust_status_counts(db, user_id, removed=deleted_statuses.values())
+                self._add_tombstones(db, user_id, deleted, revision)
+                record_task_event(db, user_id, TaskEventType.DELETED, revision, sorted(deleted))
+                db.commit()
+            else:
+                db.rollback()
+        except Exception:
+            db.rollback()
+            raise
+        return [(i, TaskCRUDResult.SUCCESS if i in deleted else missing[i]) for i in ids]
+
+    def import_tasks(self, db: Session, user_id: int, tasks: List[dict]) -> int:
+        """Load validated rows in one transaction, with COPY on PostgreSQL."""
+        try:
+            revision = self.bump_task_version(db, user_id)
+            rows = [self._import_row(t, user_id, revision) for t in tasks]
+            if db.get_bind().dialect.name == "postgresql":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor = db.connection().connection.cursor()
+                cursor.copy_expert(f"COPY {Task.__tablename__} ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                db.execute(insert(Task), [dict(zip(IMPORT_COLUMNS, row)) for row in rows])
+            self.adjust_status_counts(db, user_id, added=[TaskStatus(row[2]) for row in rows])
+            record_task_event(db, user_id, TaskEventType.IMPORTED, revision)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return len(rows)
+
+    def _import_row(self, task: dict, user_id: int, revision: int) -> tuple:
+        status = task.get("status", TaskStatus.NEW)
+        return task["title"], task.get("description"), status.value, user_id, revision, completed_at(status)
+
+    def archive_completed_tasks(self, db: Session, before: Optional[datetime], batch_size: int = 1000,
+                                include_undated: bool = False) -> int:
+        """Move up to ``batch_size`` tasks completed before ``before`` to archived_tasks.
+
+        One transaction; each owner's version is bumped, so their list ETags and
+        cached pages change. include_undated also moves completed tasks without
+        completed_at, which were completed before it was recorded. Returns the
+        number of tasks moved, 0 once none is left.
+        """
+        due = []
+        if before is not None:
+            due.append(Task.completed_at < before)
+        if include_undated:
+            due.append(Task.completed_at.is_(None))
+        if not due:
+            return 0
+        candidates = db.execute(
+            select(Task.user_id, Task.id)
+            .where(Task.status == TaskStatus.COMPLETED, or_(*due))
+            .order_by(Task.completed_at)
+            .limit(batch_size)
+        ).all()
+        by_user = defaultdict(list)
+        for user_id, task_id in candidates:
+            by_user[user_id].append(task_id)
+        moved = 0
+        try:
+            for user_id, ids in by_user.items():
+                # the owner's row lock keeps writers off the tasks while they move
+                revision = self.bump_task_version(db, user_id)
+                # a task reopened since the candidates were read stays
+                still_due = select(*(getattr(Task, c) for c in ARCHIVE_COLUMNS)).where(
+                    Task.id.in_(ids), Task.user_id == user_id, Task.status == TaskStatus.COMPLETED, or_(*due)
+                )
+                db.execute(insert(ArchivedTask).from_select(ARCHIVE_COLUMNS, still_due))
+                archived = db.scalars(
+                    delete(Task)
+                    .where(Task.id.in_(select(ArchivedTask.id).where(ArchivedTask.id.in_(ids))))
+                    .returning(Task.id)
+                ).all()
+                if archived:
+                    record_task_event(db, user_id, TaskEventType.ARCHIVED, revision, sorted(archived))
+                    moved += len(archived)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return moved
+
+    def get_status_counts(self, db: Session, user_id: int) -> Dict[TaskStatus, int]:
+        counts = dict.fromkeys(TaskStatus, 0)
+        counts.update(db.execute(
+            select(TaskStatusCount.status, TaskStatusCount.count).where(TaskStatusCount.user_id == user_id)
+        ).all())
+        return counts
+
+    def adjust_status_counts(self, db: Session, user_id: int, added: Iterable[TaskStatus] = (),
+                             removed: Iterable[TaskStatus] = ()) -> None:
+        """Count tasks written with ``added`` statuses in and ``removed`` ones out, in the caller's transaction."""
+        deltas = Counter(added)
+        deltas.subtract(removed)
+        rows = [{"user_id": user_id, "status": status, "count": delta} for status, delta in deltas.items() if delta]
+        if not rows:
+            return
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        upsert = dialect.insert(TaskStatusCount)
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[TaskStatusCount.user_id, TaskStatusCount.status],
+            set_={"count": TaskStatusCount.count + upsert.excluded.count},
+        ), rows)
+
+    def rebuild_status_counts(self, db: Session, user_ids: Iterable[int]) -> None:
+        """Recount the users' task_status_counts rows from tasks and archived_tasks, and commit.
+
+        Bumps their task versions like a write: the bump takes the row locks
+        writers take first, so none lands between the count and the replace, and
+        changes the ETags clients revalidate /stats with.
+        """
+        user_ids = list(user_ids)
+        try:
+            db.execute(
+                update(User)
+                .where(User.id.in_(user_ids))
+                .values(task_version=User.task_version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            tasks = union_all(
+                select(Task.user_id, Task.status).where(Task.user_id.in_(user_ids)),
+                select(ArchivedTask.user_id, ArchivedTask.status).where(ArchivedTask.user_id.in_(user_ids)),
+            ).subquery()
+            counts = select(tasks.c.user_id, tasks.c.status, func.count()).group_by(tasks.c.user_id, tasks.c.status)
+            db.execute(delete(TaskStatusCount).where(TaskStatusCount.user_id.in_(user_ids)))
+            db.execute(insert(TaskStatusCount).from_select(["user_id", "status", "count"], counts))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    def prune_tombstones(self, db: Session, before: datetime, batch_size: int = 1000) -> int:
+        """Delete up to ``batch_size`` tombstones of deletes before ``before``, in one transaction.
+
+        Raises each owner's pruned_revision to the newest revision removed, so
+        /changes turns away clients that could miss those deletes. Returns the
+        number removed, 0 once none is left.
+        """
+        try:
+            rows = db.execute(
+                select(TaskTombstone.id, TaskTombstone.user_id, TaskTombstone.revision)
+                .where(TaskTombstone.deleted_at < before)
+                .order_by(TaskTombstone.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                db.rollback()
+                return 0
+            pruned = defaultdict(int)
+            for _, user_id, revision in rows:
+                pruned[user_id] = max(pruned[user_id], revision)
+            for user_id, revision in pruned.items():
+                db.execute(
+                    update(User)
+                    .where(User.id == user_id, User.pruned_revision < revision)
+                    .values(pruned_revision=revision)
+                    .execution_options(synchronize_session=False)
+                )
+            db.execute(delete(TaskTombstone).where(TaskTombstone.id.in_([row.id for row in rows])))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return len(rows)
+
+    def get_pruned_revision(self, db: Session, user_id: int) -> int:
+        return db.scalar(select(User.pruned_revision).where(User.id == user_id)) or 0
+
+    def get_task_version(self, db: Session, user_id: int) -> Optional[int]:
+        return db.scalar(select(User.task_version).where(User.id == user_id))
+
+    def bump_task_version(self, db: Session, user_id: int) -> Optional[int]:
+        """Advance the user's task version inside the caller's transaction.
+
+        Writers call this before touching tasks and stamp the new version on the
+        rows as their revision. The row lock it takes serializes a user's writes,
+        so revisions commit in order and /changes never skips one. Returns None
+        for an unknown user.
+        """
+        return db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(task_version=User.task_version + 1)
+            .returning(User.task_version)
+            .execution_options(synchronize_session=False)
+        ).scalar_one_or_none()
+
+    def _update_event(self, status: Optional[TaskStatus]) -> TaskEventType:
+        return TaskEventType.COMPLETED if status == TaskStatus.COMPLETED else TaskEventType.UPDATED
+
+    def _add_tombstones(self, db: Session, user_id: int, task_ids: Iterable[int], revision: int) -> None:
+        db.execute(insert(TaskTombstone), [
+            {"task_id": task_id, "user_id": user_id, "revision": revision} for task_id in task_ids
+        ])
+
+    def _update_returning_old(self, db: Session, where: tuple, values: dict) -> List[Tuple[Task, TaskStatus]]:
+        """Update the tasks matching where, returning (task, status before the update) rows.
+
+        On PostgreSQL the old status comes from a subquery joined into the
+        UPDATE, read from the statement's snapshot, so the status counts cost
+        no extra round trip. SQLite cannot return columns of the FROM tables
+        and reads them first, in process.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            old = select(Task.id, Task.status).where(*where).subquery()
+            return db.execute(update(Task).where(Task.id == old.c.id).values(**values).returning(Task, old.c.status)).all()
+        # read under the owner's lock taken by the bump, so it cannot change meanwhile
+        old_statuses = dict(db.execute(select(Task.id, Task.status).where(*where)).all())
+        updated = db.scalars(update(Task).where(*where).values(**values).returning(Task)).all()
+        return [(task, old_statuses[task.id]) for task in updated]
+
+    def _unarchive(self, db: Session, user_id: int, task_ids: List[int]) -> dict:
+        """Move the user's archived tasks among task_ids back to tasks, keeping their ids.
+
+        Returns {task_id: status} of the moved tasks. Only called once the
+        write on tasks missed, so the usual write pays nothing for it.
+        """
+        if not task_ids:
+            return {}
+        archived = select(*(getattr(ArchivedTask, c) for c in ARCHIVE_COLUMNS)).where(
+            ArchivedTask.id.in_(task_ids), ArchivedTask.user_id == user_id
+        )
+        db.execute(insert(Task).from_select(ARCHIVE_COLUMNS, archived))
+        return dict(self._delete_archived(db, user_id, task_ids).all())
+
+    def _delete_archived(self, db: Session, user_id: int, task_ids: List[int]) -> Result:
+        """Delete the user's archived tasks among task_ids, yielding (id, status) rows."""
+        return db.execute(
+            delete(ArchivedTask)
+            .where(ArchivedTask.id.in_(task_ids), ArchivedTask.user_id == user_id)
+            .returning(ArchivedTask.id, ArchivedTask.status)
+        )
+
+    def _missing_results(self, db: Session, task_ids: List[int]) -> dict:
+        """Tell apart ids that do not exist from ids owned by another user."""
+        if not task_ids:
+            return {}
+        existing = set(db.scalars(
+            union_all(select(Task.id).where(Task.id.in_(task_ids)), select(ArchivedTask.id).where(ArchivedTask.id.in_(task_ids)))
+        ).all())
+        return {
+            i: TaskCRUDResult.ACCESS_DENIED if i in existing else TaskCRUDResult.NOT_FOUND
+            for i in task_ids
+        }
+
+task_crud = TaskCRUD()
+
+
+class AsyncTaskCRUD:
+    """Async facade over TaskCRUD.
+
+    Each call runs the sync implementation through AsyncSession.run_sync, so the
+    queries go over the async driver and never block the event loop. The hot
+    list and count queries go through task_query_cache.
+    """
+
+    def __init__(self, crud: TaskCRUD):
+        self.crud = crud
+
+    async def get_all_tasks(self, db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, as_rows: bool = False, fields: Optional[Sequence[str]] = None) -> List[Task]:
+        return await db.run_sync(self.crud.get_all_tasks, skip=skip, limit=limit, after_id=after_id, as_rows=as_rows, fields=fields)
+
+    async def get_user_tasks(self, db: AsyncSession, user_id: int, status: Optional[TaskStatus] = None, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, as_rows: bool = False, fields: Optional[Sequence[str]] = None,
+                             include_archived: bool = False) -> List[Task]:
+        key = ("get_user_tasks", user_id, status, skip, limit, after_id, as_rows, tuple(fields) if fields is not None else None, include_archived)
+        return await task_query_cache.run(key, user_id, lambda: db.run_sync(
+            self.crud.get_user_tasks, user_id=user_id, status=status, skip=skip, limit=limit, after_id=after_id, as_rows=as_rows, fields=fields,
+            include_archived=include_archived
+        ))
+
+    async def search_user_tasks(self, db: AsyncSession, user_id: int, query: str, limit: int = 10,
+                                after: Optional[Tuple[float, int]] = None) -> List[Row]:
+        return await db.run_sync(self.crud.search_user_tasks, user_id=user_id, query=query, limit=limit, after=after)
+
+    async def get_task_by_id(self, db: AsyncSession, task_id: int) -> Optional[Task]:
+        return await db.get(Task, task_id) or await db.get(ArchivedTask, task_id)
+
+    async def stream_user_tasks(self, db: AsyncSession, user_id: int, status: Optional[TaskStatus] = None, batch_size: int = 500,
+                                include_archived: bool = False) -> AsyncIterator[List[Row]]:
+        """Yield the user's tasks in batches from a server-side cursor."""
+        query = self.crud.export_query(user_id=user_id, status=status, include_archived=include_archived)
+        query = query.execution_options(yield_per=batch_size)
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield rows
+
+    async def get_tasks_by_status(self, db: AsyncSession, status: TaskStatus, skip: int = 0, limit: int = 100) -> List[Task]:
+        return await db.run_sync(self.crud.get_tasks_by_status, status=status, skip=skip, limit=limit)
+
+    async def get_task_changes(self, db: AsyncSession, user_id: int, since: Optional[int] = None, limit: int = 500) -> Tuple[List[Tuple[int, int, Optional[Task]]], bool]:
+        return await db.run_sync(self.crud.get_task_changes, user_id=user_id, since=since, limit=limit)
+
+    async def count_user_tasks(self, db: AsyncSession, user_id: int, status: Optional[TaskStatus] = None, include_archived: bool = False) -> int:
+        key = ("count_user_tasks", user_id, status, include_archived)
+        return await task_query_cache.run(key, user_id, lambda: db.run_sync(
+            self.crud.count_user_tasks, user_id=user_id, status=status, include_archived=include_archived
+        ))
+
+    async def count_all_tasks(self, db: AsyncSession) -> int:
+        return await task_query_cache.run(("count_all_tasks",), None, lambda: db.run_sync(self.crud.count_all_tasks))
+
+    async def get_status_counts(self, db: AsyncSession, user_id: int) -> Dict[TaskStatus, int]:
+        return await task_query_cache.run(("get_status_counts", user_id), user_id, lambda: db.run_sync(self.crud.get_status_counts, user_id))
+
+    async def get_pruned_revision(self, db: AsyncSession, user_id: int) -> int:
+        return await db.run_sync(self.crud.get_pruned_revision, user_id)
+
+    async def get_task_version(self, db: AsyncSession, user_id: int) -> Optional[int]:
+        return await db.run_sync(self.crud.get_task_version, user_id)
+
+    async def create_task(self, db: AsyncSession, title: str, user_id: int, description: Optional[str] = None, status: TaskStatus = TaskStatus.NEW) -> Tuple[Optional[Task], TaskCRUDResult]:
+        return await db.run_sync(self.crud.create_task, title=title, user_id=user_id, description=description, status=status)
+
+    async def update_task(self, db: AsyncSession, task_id: int, user_id: int, title: Optional[str] = None, description: Optional[str] = None, status: Optional[TaskStatus] = None,) -> Tuple[Optional[Task], TaskCRUDResult]:
+        return await db.run_sync(self.crud.update_task, task_id=task_id, user_id=user_id, title=title, description=description, status=status)
+
+    async def delete_task(self, db: AsyncSession, task_id: int, user_id: int) -> Tuple[bool, TaskCRUDResult]:
+        return await db.run_sync(self.crud.delete_task, task_id=task_id, user_id=user_id)
+
+    async def create_tasks(self, db: AsyncSession, user_id: int, tasks: Iterable[dict]) -> Tuple[List[Task], TaskCRUDResult]:
+        return await db.run_sync(self.crud.create_tasks, user_id=user_id, tasks=tasks)
+
+    async def update_tasks_status(self, db: AsyncSession, task_ids: Iterable[int], user_id: int, status: TaskStatus) -> List[Tuple[int, Optional[Task], TaskCRUDResult]]:
+        return await db.run_sync(self.crud.update_tasks_status, task_ids=task_ids, user_id=user_id, status=status)
+
+    async def delete_tasks(self, db: AsyncSession, task_ids: Iterable[int], user_id: int) -> List[Tuple[int, TaskCRUDResult]]:
+        return await db.run_sync(self.crud.delete_tasks, task_ids=task_ids, user_id=user_id)
+
+    async def import_tasks(self, db: AsyncSession, user_id: int, tasks: List[dict]) -> int:
+        if db.get_bind().dialect.name != "postgresql":
+            return await db.run_sync(self.crud.import_tasks, user_id=user_id, tasks=tasks)
+        try:
+            # the first statement opens the transaction that COPY then joins
+            revision = await db.run_sync(self.crud.bump_task_version, user_id)
+            await db.run_sync(record_task_event, user_id, TaskEventType.IMPORTED, revision)
+            records = [self.crud._import_row(t, user_id, revision) for t in tasks]
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(Task.__tablename__, records=records, columns=IMPORT_COLUMNS)
+            await db.run_sync(self.crud.adjust_status_counts, user_id, added=[TaskStatus(record[2]) for record in records])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return len(records)
+
+async_task_crud = AsyncTaskCRUD(task_crud)
\ No newline at end of file
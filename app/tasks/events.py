@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from typing import Iterable, Optional
+import asyncpg
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from app.core.cache import task_query_cache
+from app.core.config import settings
+from app.core.pubsub import Broker
+from app.db import session as database
+from app.tasks.schemas import TaskEventType
+
+NOTIFY_CHANNEL = "task_events"
+# NOTIFY payloads are capped at 8000 bytes, larger writes are sent without ids
+MAX_NOTIFY_IDS = 500
+# seconds between attempts to LISTEN again after the connection was lost, doubling up to the max
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 30
+# events may have been missed, clients catch up with /changes?since=<last id>
+RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+
+logger = logging.getLogger(__name__)
+
+task_event_broker = Broker(queue_size=settings.TASK_EVENTS_QUEUE_SIZE)
+
+
+def record_task_event(db: Session, user_id: int, event_type: TaskEventType, revision: int,
+                      ids: Optional[Iterable[int]] = None) -> None:
+    """Queue an event that is published once the caller's transaction commits.
+
+    ids=None means the ids are not listed, clients catch up with /changes.
+    """
+    ids = list(ids) if ids is not None else None
+    payload = {"user_id": user_id, "type": event_type.value, "revision": revision, "ids": ids}
+    notify = settings.TASK_EVENTS_BACKEND == "postgres" and db.get_bind().dialect.name == "postgresql"
+    if notify:
+        notified = dict(payload, ids=ids if ids is None or len(ids) <= MAX_NOTIFY_IDS else None)
+        # NOTIFY is delivered on commit and dropped on rollback
+        db.execute(select(func.pg_notify(NOTIFY_CHANNEL, json.dumps(notified))))
+    db.info.setdefault("task_events", []).append((payload, notify))
+
+
+def dispatch(payload: dict) -> None:
+    user_id = payload.pop("user_id")
+    # one SSE frame per event, shared by every subscriber
+    message = f"event: {payload['type']}\nid: {payload['revision']}\ndata: {json.dumps(payload)}\n\n"
+    task_event_broker.publish(user_id, message)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for payload, notified in session.info.pop("task_events", ()):
+        # this worker reads its own writes right away, others when NOTIFY arrives
+        task_query_cache.invalidate(payload["user_id"], None)
+        database.replica_router.note_write(payload["user_id"])
+        if not notified:
+            dispatch(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session) -> None:
+    session.info.pop("task_events", None)
+
+
+class TaskEventListener:
+    """LISTENs on NOTIFY_CHANNEL and feeds every worker's commits to the local broker.
+
+    A lost connection is reopened with backoff. Commits made meanwhile are
+    not replayed: once listening again it clears the query cache and sends
+    subscribers a ``reset`` event, so they resync through /changes.
+    """
+
+    def __init__(self, database_url: str):
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.connection: Optional[asyncpg.Connection] = None
+        self._reconnecting: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self._listen()
+
+    async def _listen(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        except BaseException:
+            await connection.close()
+            raise
+        connection.add_termination_listener(self._on_terminated)
+        self.connection = connection
+        logger.info("Listening for task events on %s", NOTIFY_CHANNEL)
+
+    async def stop(self) -> None:
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            await asyncio.gather(self._reconnecting, return_exceptions=True)
+            self._reconnecting = None
+        if self.connection is not None:
+            self.connection.remove_termination_listener(self._on_terminated)
+            await self.connection.close()
+            self.connection = None
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        payload = json.loads(payload)
+        task_query_cache.invalidate(payload["user_id"], None)
+        database.replica_router.note_write(payload["user_id"])
+        dispatch(payload)
+
+    def _on_terminated(self, connection) -> None:
+        logger.error("Task event listener connection lost, reconnecting")
+        self.connection = None
+        self._reconnecting = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = RECONNECT_MIN_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._listen()
+                break
+            except (OSError, asyncpg.PostgresError):
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                logger.warning("Task event listener could not reconnect, retrying in %s s", delay, exc_info=True)
+        self._reconnecting = None
+        # other workers' writes while disconnected invalidated nothing here
+        task_query_cache.clear()
+        task_event_broker.broadcast(RESET_MESSAGE)
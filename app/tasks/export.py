@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List
+from sqlalchemy import Row
+from app.tasks.schemas import TaskFileFormat
+
+EXPORT_COLUMNS = ("id", "title", "description", "status", "user_id")
+
+MEDIA_TYPES = {
+    TaskFileFormat.NDJSON: "application/x-ndjson",
+    TaskFileFormat.CSV: "text/csv",
+}
+
+
+def _row_values(row: Row) -> tuple:
+    task_id, title, description, status, user_id = row
+    return task_id, title, description, status.value, user_id
+
+
+async def ndjson_chunks(batches: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    async for rows in batches:
+        lines = (json.dumps(dict(zip(EXPORT_COLUMNS, _row_values(row))), ensure_ascii=False) for row in rows)
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def csv_chunks(batches: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in batches:
+        writer.writerows(_row_values(row) for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_export(batches: AsyncIterator[List[Row]], export_format: TaskFileFormat, gzip: bool = False) -> AsyncIterator[bytes]:
+    chunks = ndjson_chunks(batches) if export_format == TaskFileFormat.NDJSON else csv_chunks(batches)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,85 @@
+import codecs
+import csv
+import json
+import logging
+from typing import IO, Iterator, List, Tuple
+from pydantic import ValidationError
+from app.tasks.schemas import TaskFileFormat, TaskCreate, TaskImportError, TaskImportReport
+
+IMPORT_CHUNK_SIZE = 5000
+# keep the report small when a whole file is malformed
+MAX_REPORTED_ERRORS = 100
+
+logger = logging.getLogger(__name__)
+
+
+def check_utf8(binary: IO[bytes], block_size: int = 1 << 20) -> None:
+    """Raise UnicodeDecodeError unless the whole file decodes, then rewind it.
+
+    Rows are decoded lazily while chunks are loaded, so without this a bad
+    byte would fail the import halfway through.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while block := binary.read(block_size):
+        decoder.decode(block)
+    decoder.decode(b"", final=True)
+    binary.seek(0)
+
+
+def _records(text: IO[str], import_format: TaskFileFormat) -> Iterator[Tuple[int, object]]:
+    if import_format == TaskFileFormat.NDJSON:
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+    else:
+        reader = csv.DictReader(text)
+        for record in reader:
+            # empty cells mean "not set", so the TaskCreate defaults apply
+            yield reader.line_num, {k: v for k, v in record.items() if v != ""}
+
+
+def record_error(report: TaskImportReport, line: int, error: str) -> None:
+    report.failed += 1
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(TaskImportError(line=line, error=error))
+
+
+def validated_chunks(text: IO[str], import_format: TaskFileFormat, report: TaskImportReport,
+                     chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[List[Tuple[int, dict]]]:
+    """Parse and validate rows lazily, yielding (line, TaskCreate dump) chunks.
+
+    Invalid rows are recorded in ``report`` and skipped.
+    """
+    chunk = []
+    for line_no, record in _records(text, import_format):
+        if isinstance(record, Exception):
+            record_error(report, line_no, f"Invalid JSON: {record}")
+            continue
+        try:
+            task = TaskCreate.model_validate(record)
+        except ValidationError as e:
+            record_error(report, line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        chunk.append((line_no, task.model_dump()))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def record_failed_chunk(report: TaskImportReport, chunk: List[Tuple[int, dict]], error: Exception) -> None:
+    # rows were valid, so a failed load is a database problem worth a traceback
+    logger.exception("Could not load lines %d-%d", chunk[0][0], chunk[-1][0])
+    for line_no, _ in chunk:
+        record_error(report, line_no, f"Could not store row: {type(error).__name__}")
+
+
+def finish_report(report: TaskImportReport, seconds: float) -> TaskImportReport:
+    report.seconds = round(seconds, 3)
+    report.rows_per_second = round(report.imported / seconds, 1) if seconds else 0.0
+    return report
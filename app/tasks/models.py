@@ -1,5 +1,5 @@
 from app.tasks.schemas import TaskStatus
-from sqlalchemy import Column, Integer, String, Text, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Enum, ForeignKey, Index, DateTime, DDL, event, func, text
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -11,8 +11,119 @@ class Task(Base):
     description = Column(Text, nullable=True)
     status = Column(Enum(TaskStatus, name="taskstatus", create_type=False), default=TaskStatus.NEW, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # owner's task_version as of the last write to this row, drives /changes
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # set whenever status becomes COMPLETED, drives archiving
+    completed_at = Column(DateTime(timezone=True), nullable=True)
 
     owner = relationship("User", back_populates="tasks")
 
+    __table_args__ = (
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        Index("ix_tasks_user_id_status_id", "user_id", "status", "id"),
+        Index("ix_tasks_status_id", "status", "id"),
+        Index("ix_tasks_user_id_revision", "user_id", "revision"),
+        Index("ix_tasks_completed_at", "completed_at",
+              postgresql_where=text("status = 'COMPLETED'"), sqlite_where=text("status = 'COMPLETED'")),
+        # ids of archived tasks must never be handed out again; scripts/__init__db.py
+        # rebuilds SQLite tables created before this
+        {"sqlite_autoincrement": True},
+    )
+
+    def __repr__(self):
+        return f"<Task(id={self.id}, title='{self.title}', status='{self.status.value}', user_id={self.user_id})>"
+
+
+# Full-text index over title and description, outside the mapped columns since
+# each database builds it differently: a generated tsvector column with a GIN
+# index on PostgreSQL, an FTS5 table kept in sync by triggers on SQLite. The
+# statements are idempotent, scripts/__init__db.py runs them on existing tables.
+SEARCH_CONFIG = "english"
+SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+        f"(to_tsvector('{SEARCH_CONFIG}', title || ' ' || coalesce(description, ''))) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING gin (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+        "title, description, content='tasks', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN "
+        "INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        # indexes rows written before the triggers existed
+        "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')",
+    ],
+}
+
+for dialect, statements in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Task.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+event.listen(Task.__table__, "before_drop", DDL("DROP TABLE IF EXISTS tasks_fts").execute_if(dialect="sqlite"))
+
+
+class TaskTombstone(Base):
+    """Marks a deleted task, so delta sync clients learn about the delete."""
+    __tablename__ = "task_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    revision = Column(BigInteger, nullable=False)
+    # drives pruning; NULL only before scripts/__init__db.py backfills older rows
+    deleted_at = Column(DateTime(timezone=True), nullable=True, default=func.now())
+
+    __table_args__ = (
+        Index("ix_task_tombstones_user_id_revision", "user_id", "revision"),
+        Index("ix_task_tombstones_deleted_at", "deleted_at"),
+    )
+
+    def __repr__(self):
+        return f"<TaskTombstone(task_id={self.task_id}, user_id={self.user_id}, revision={self.revision})>"
+
+
+class ArchivedTask(Base):
+    """A completed task moved out of tasks by scripts/archive_tasks.py.
+
+    Keeps the id and revision it had in tasks, so links and /changes still
+    find it. Writing to it moves it back to tasks; deleting removes it here.
+    """
+    __tablename__ = "archived_tasks"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String(200), nullable=False)
+    description = Column(Text, nullable=True)
+    status = Column(Enum(TaskStatus, name="taskstatus", create_type=False), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    revision = Column(BigInteger, nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_archived_tasks_user_id_id", "user_id", "id"),
+        Index("ix_archived_tasks_user_id_revision", "user_id", "revision"),
+    )
+
+    def __repr__(self):
+        return f"<ArchivedTask(id={self.id}, title='{self.title}', user_id={self.user_id})>"
+
+
+class TaskStatusCount(Base):
+    """Number of a user's tasks, archived ones included, per status.
+
+    TaskCRUD adjusts it in the transaction of every write, so /stats reads one
+    row per status instead of counting tasks. scripts/rebuild_task_stats.py
+    recounts it from the tasks if it ever drifts.
+    """
+    __tablename__ = "task_status_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(Enum(TaskStatus, name="taskstatus", create_type=False), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0, server_default="0")
+
     def __repr__(self):
-        return f"<Task(id={self.id}, title='{self.title}', status='{self.status.value}', user_id={self.user_id})>"
\ No newline at end of file
+        return f"<TaskStatusCount(user_id={self.user_id}, status='{self.status.value}', count={self.count})>"
@@ -1,9 +1,11 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List, Generic, TypeVar
+from typing import Optional, List, Dict, Generic, TypeVar
 from enum import Enum
 
 T = TypeVar('T')
 
+BULK_MAX_ITEMS = 1000
+
 class TaskCRUDResult(str, Enum):
     SUCCESS = "SUCCESS"
     NOT_FOUND = "NOT_FOUND"
@@ -15,6 +17,18 @@ class TaskStatus(str, Enum):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETED = "COMPLETED"
 
+class TaskFileFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class TaskEventType(str, Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    COMPLETED = "completed"
+    DELETED = "deleted"
+    IMPORTED = "imported"
+    ARCHIVED = "archived"
+
 class TaskBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
     description: Optional[str] = Field(None, max_length=1000)
@@ -35,12 +49,69 @@ class TaskResponse(TaskBase):
     user_id: int = Field(...)
     model_config = ConfigDict(from_attributes=True, extra="forbid")
 
+class TaskFieldsResponse(BaseModel):
+    """Slim list item for ?fields=, only the requested fields are set."""
+    id: int = Field(...)
+    title: Optional[str] = Field(None)
+    description: Optional[str] = Field(None)
+    status: Optional[TaskStatus] = Field(None)
+    user_id: Optional[int] = Field(None)
+
 class PaginatedResponse(BaseModel, Generic[T]):
     items: List[T] = Field(...)
-    total: int = Field(...)
+    total: Optional[int] = Field(...)
     page: int = Field(..., ge=1)
-    pages: int = Field(..., ge=0)
+    pages: Optional[int] = Field(..., ge=0)
     size: int = Field(..., ge=1)
     has_next: bool = Field(...)
     has_prev: bool = Field(...)
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    next_cursor: Optional[str] = Field(None)
+    model_config = ConfigDict(from_attributes=True)
+
+class TaskBulkCreate(BaseModel):
+    items: List[TaskCreate] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    model_config = ConfigDict(extra="forbid")
+
+class TaskBulkStatusUpdate(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    status: TaskStatus = Field(...)
+    model_config = ConfigDict(extra="forbid")
+
+class TaskBulkDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    model_config = ConfigDict(extra="forbid")
+
+class TaskBulkItemResult(BaseModel):
+    id: Optional[int] = Field(None)
+    result: TaskCRUDResult = Field(...)
+    task: Optional[TaskResponse] = Field(None)
+
+class TaskBulkResponse(BaseModel):
+    results: List[TaskBulkItemResult] = Field(...)
+
+class TaskChange(BaseModel):
+    """A task written after ``since``, or with deleted=True only its id."""
+    id: int = Field(...)
+    revision: int = Field(...)
+    deleted: bool = Field(False)
+    task: Optional[TaskResponse] = Field(None)
+
+class TaskChangesResponse(BaseModel):
+    changes: List[TaskChange] = Field(...)
+    revision: int = Field(..., ge=0)
+    has_more: bool = Field(...)
+
+class TaskImportError(BaseModel):
+    line: int = Field(...)
+    error: str = Field(...)
+
+class TaskImportReport(BaseModel):
+    imported: int = Field(0)
+    failed: int = Field(0)
+    errors: List[TaskImportError] = Field(default_factory=list)
+    seconds: float = Field(0.0)
+    rows_per_second: float = Field(0.0)
+
+class TaskStatsResponse(BaseModel):
+    counts: Dict[TaskStatus, int] = Field(..., description="Tasks per status, archived ones included")
+    total: int = Field(...)
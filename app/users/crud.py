@@ -1,17 +1,21 @@
 from typing import Optional
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from app.users.models import User
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash, get_password_hash_async
 
 class UserCRUD:
     def create_user(self,db: Session,first_name: str,username: str,password: str,last_name: Optional[str] = None,) -> Optional[User]:
         hashed = get_password_hash(password)
+        return self.add_user(db, first_name=first_name, username=username, hashed_password=hashed, last_name=last_name)
+
+    def add_user(self,db: Session,first_name: str,username: str,hashed_password: str,last_name: Optional[str] = None,) -> Optional[User]:
         user = User(
             first_name=first_name,
             last_name=last_name,
             username=username,
-            hashed_password=hashed,
+            hashed_password=hashed_password,
         )
         try:
             db.add(user)
@@ -25,4 +29,30 @@ class UserCRUD:
     def get_user_by_username(self, db: Session, username: str) -> Optional[User]:
         return db.query(User).filter(User.username == username).first()
 
-user_crud = UserCRUD()
\ No newline at end of file
+    def update_password_hash(self, db: Session, user: User, hashed_password: str) -> User:
+        user.hashed_password = hashed_password
+        try:
+            db.commit()
+            return user
+        except Exception:
+            db.rollback()
+            raise
+
+user_crud = UserCRUD()
+
+
+class AsyncUserCRUD:
+    def __init__(self, crud: UserCRUD):
+        self.crud = crud
+
+    async def create_user(self,db: AsyncSession,first_name: str,username: str,password: str,last_name: Optional[str] = None,) -> Optional[User]:
+        hashed = await get_password_hash_async(password)
+        return await db.run_sync(self.crud.add_user, first_name=first_name, username=username, hashed_password=hashed, last_name=last_name)
+
+    async def get_user_by_username(self, db: AsyncSession, username: str) -> Optional[User]:
+        return await db.run_sync(self.crud.get_user_by_username, username)
+
+    async def update_password_hash(self, db: AsyncSession, user: User, hashed_password: str) -> User:
+        return await db.run_sync(self.crud.update_password_hash, user, hashed_password)
+
+async_user_crud = AsyncUserCRUD(user_crud)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, BigInteger
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -13,6 +13,10 @@ class User(Base):
     last_name = Column(String(100), nullable=True)
     username = Column(String(50), unique=True, nullable=False, index=True)
     hashed_password = Column(String(255), nullable=False)
+    # bumped by every write to the user's tasks, drives list/detail ETags
+    task_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # newest revision whose tombstones were pruned, /changes answers 410 to an older since
+    pruned_revision = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     tasks = relationship(
         "Task",
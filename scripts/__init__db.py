@@ -2,16 +2,80 @@ import logging
 import app.users.models  # noqa: F401
 import app.tasks.models  # noqa: F401
 
+from sqlalchemy import MetaData, func, inspect, select, update
+from sqlalchemy.schema import CreateColumn, CreateTable
 from app.db.base import Base
 from app.db.session import engine
+from app.db.session import SessionLocal
+from app.tasks.crud import task_crud
+from app.tasks.models import SEARCH_DDL, Task, TaskStatusCount, TaskTombstone
+from app.users.models import User
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def rebuild_sqlite_tasks(conn) -> bool:
+    """Recreate a SQLite tasks table created without AUTOINCREMENT.
+
+    SQLite only applies it in CREATE TABLE, and without it the id of the
+    newest task is handed out again once that task is archived. Indexes and
+    search triggers go with the old table; main() recreates them afterwards.
+    """
+    create_sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'").scalar()
+    if "AUTOINCREMENT" in create_sql.upper():
+        return False
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    conn.execute(CreateTable(Task.__table__.to_metadata(metadata, name="tasks_rebuilt")))
+    columns = ", ".join(column.name for column in Task.__table__.columns)
+    conn.exec_driver_sql(f"INSERT INTO tasks_rebuilt ({columns}) SELECT {columns} FROM tasks")
+    conn.exec_driver_sql("DROP TABLE tasks")
+    conn.exec_driver_sql("ALTER TABLE tasks_rebuilt RENAME TO tasks")
+    # continue after every id handed out so far, archived ones included
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+    conn.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks', max("
+        "(SELECT coalesce(max(id), 0) FROM tasks), (SELECT coalesce(max(id), 0) FROM archived_tasks))"
+    )
+    reused = conn.exec_driver_sql("SELECT count(*) FROM tasks JOIN archived_tasks USING (id)").scalar()
+    if reused:
+        logger.warning("%d task ids are in both tasks and archived_tasks, archiving them will fail", reused)
+    return True
+
+
 def main():
     logger.info("Database tables creation")
+    counted = inspect(engine).has_table(TaskStatusCount.__tablename__)
     Base.metadata.create_all(bind=engine)
     logger.info("Tables created")
+    # create_all skips tables that already exist, so add columns and indexes introduced later
+    existing = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            present = {column["name"] for column in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in present:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    logger.info("Added column %s.%s", table.name, column.name)
+                    if column is TaskTombstone.__table__.c.deleted_at:
+                        # older tombstones are kept a full retention period from now
+                        conn.execute(update(TaskTombstone).values(deleted_at=func.now()))
+        if engine.dialect.name == "sqlite" and rebuild_sqlite_tasks(conn):
+            logger.info("Rebuilt tasks with AUTOINCREMENT")
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    logger.info("Indexes created")
+    with engine.begin() as conn:
+        for statement in SEARCH_DDL.get(engine.dialect.name, []):
+            conn.exec_driver_sql(statement)
+    logger.info("Search index created")
+    if not counted:
+        # tasks written before the counts existed
+        with SessionLocal() as db:
+            task_crud.rebuild_status_counts(db, db.scalars(select(User.id)).all())
+        logger.info("Task status counts built")
 
 if __name__ == "__main__":
     main()
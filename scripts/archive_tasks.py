@@ -0,0 +1,72 @@
+"""Move completed tasks older than a threshold from tasks to archived_tasks.
+
+Runs in batches of ``--batch-size`` tasks, one transaction each, until no
+task is due, so it can run from cron while the API serves traffic. Archived
+tasks are still listed by GET /api/tasks with status=COMPLETED or
+include_archived=true, and by /changes and the detail endpoint. Usage::
+
+    python -m scripts.archive_tasks --days 30
+    python -m scripts.archive_tasks --days 90 --include-undated --pause 0.5
+
+``--include-undated`` also moves completed tasks without completed_at, i.e.
+completed before the column was added. Afterwards it prunes the tombstones of
+deletes older than ``--tombstone-days`` (TASK_TOMBSTONE_RETENTION_DAYS); delta
+sync clients that last synced before them get 410 from /changes.
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.tasks.crud import task_crud
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run(args) -> int:
+    before = datetime.now(timezone.utc) - timedelta(days=args.days)
+    total = 0
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        while moved := task_crud.archive_completed_tasks(db, before, args.batch_size, args.include_undated):
+            total += moved
+            logger.info("%d tasks archived", total)
+            if args.pause:
+                # leave room for the API's writes between batches
+                time.sleep(args.pause)
+    logger.info("Archived %d tasks completed before %s in %.1f s", total, before.isoformat(timespec="seconds"),
+                time.perf_counter() - start)
+    prune_tombstones(args)
+    return total
+
+
+def prune_tombstones(args) -> int:
+    before = datetime.now(timezone.utc) - timedelta(days=args.tombstone_days)
+    total = 0
+    with SessionLocal() as db:
+        while pruned := task_crud.prune_tombstones(db, before, args.batch_size):
+            total += pruned
+            if args.pause:
+                time.sleep(args.pause)
+    logger.info("Pruned %d tombstones of deletes before %s", total, before.isoformat(timespec="seconds"))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=settings.TASK_ARCHIVE_AFTER_DAYS,
+                        help="archive tasks completed more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=settings.TASK_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--include-undated", action="store_true")
+    parser.add_argument("--tombstone-days", type=float, default=settings.TASK_TOMBSTONE_RETENTION_DAYS,
+                        help="prune tombstones of tasks deleted more than this many days ago")
+    parser.add_argument("--pause", type=float, default=0, help="seconds to sleep between batches")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
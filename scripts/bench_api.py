@@ -0,0 +1,256 @@
+"""Load test of the task API over seeded users and tasks.
+
+Seeds ``--users`` users with ``--tasks-per-user`` tasks each into DATABASE_URL
+(PostgreSQL, or SQLite as a stand-in), then drives the API with
+``--concurrency`` clients, in process through httpx's ASGI transport or against
+``--url``, e.g. a local uvicorn. Reports p50/p95/p99 latency and requests per
+second for login, list (first and last page), detail, create, update, complete
+and delete. Usage::
+
+    python -m scripts.bench_api --users 20 --tasks-per-user 1000 --output before.json
+    python -m scripts.bench_api --url http://127.0.0.1:8000 --skip-seed --baseline before.json
+
+``--database-url sqlite:///bench.db`` runs it without a database server, in
+seconds with small ``--users`` and ``--tasks-per-user``. ``--output`` saves the
+results with the commit and settings they were taken with, ``--baseline``
+prints the change against an earlier run.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+import httpx
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+from sqlalchemy import delete, insert, select
+from app.core.config import settings
+from app.core.security import create_access_token, get_password_hash
+from app.db.base import Base
+from app.db import session
+from app.db.session import SessionLocal, configure_database
+from app.tasks.crud import task_crud
+from app.tasks.models import Task, TaskTombstone, TaskStatusCount
+from app.tasks.schemas import TaskStatus
+from app.users.models import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# one line per request would drown the summary
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+BENCH_USERNAME_PREFIX = "bench_user_"
+BENCH_PASSWORD = "bench-password"
+PAGE_SIZE = 10
+SEED_CHUNK_SIZE = 10000
+OPERATIONS = ("login", "list_first", "list_deep", "detail", "create", "update", "complete", "delete")
+
+
+def seed(users: int, tasks_per_user: int) -> None:
+    """Replace the bench users and their tasks, so every run starts from the same data."""
+    Base.metadata.create_all(bind=session.engine)
+    statuses = list(TaskStatus)
+    with SessionLocal() as db:
+        old_ids = select(User.id).where(User.username.startswith(BENCH_USERNAME_PREFIX))
+        # explicit deletes, SQLite does not enforce ON DELETE CASCADE by default
+        db.execute(delete(Task).where(Task.user_id.in_(old_ids)))
+        db.execute(delete(TaskTombstone).where(TaskTombstone.user_id.in_(old_ids)))
+        db.execute(delete(TaskStatusCount).where(TaskStatusCount.user_id.in_(old_ids)))
+        db.execute(delete(User).where(User.username.startswith(BENCH_USERNAME_PREFIX)))
+        hashed_password = get_password_hash(BENCH_PASSWORD)
+        user_ids = db.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), [
+            {"first_name": "Bench", "username": f"{BENCH_USERNAME_PREFIX}{u}", "hashed_password": hashed_password, "task_version": 1}
+            for u in range(users)
+        ]).all()
+        rows = (
+            {"title": f"Bench task {i}", "description": f"Seeded task {i} of user {user_id}",
+             "status": statuses[i % len(statuses)], "user_id": user_id, "revision": 1}
+            for user_id in user_ids for i in range(tasks_per_user)
+        )
+        while chunk := list(itertools.islice(rows, SEED_CHUNK_SIZE)):
+            db.execute(insert(Task), chunk)
+        db.commit()
+        task_crud.rebuild_status_counts(db, user_ids)
+    logger.info("Seeded %d users x %d tasks", users, tasks_per_user)
+
+
+def load_bench_users() -> List[Tuple[str, List[int]]]:
+    with SessionLocal() as db:
+        users = db.execute(
+            select(User.username, Task.id)
+            .join(Task, Task.user_id == User.id)
+            .where(User.username.startswith(BENCH_USERNAME_PREFIX))
+            .order_by(User.username, Task.id)
+        ).all()
+    by_user: Dict[str, List[int]] = {}
+    for username, task_id in users:
+        by_user.setdefault(username, []).append(task_id)
+    return sorted(by_user.items())
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> dict:
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(percentiles[49] * 1000, 2),
+        "p95_ms": round(percentiles[94] * 1000, 2),
+        "p99_ms": round(percentiles[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def run_operation(client: httpx.AsyncClient, count: int, concurrency: int,
+                        make_request: Callable[[int], Tuple[str, str, dict]],
+                        on_response: Callable[[int, httpx.Response], None] = None) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < count:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+            elif on_response is not None:
+                on_response(i, response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def bench(args) -> dict:
+    users = load_bench_users()
+    if not users:
+        raise SystemExit("No bench users found, run without --skip-seed first")
+    rng = random.Random(args.seed)
+    headers = {username: {"Authorization": f"Bearer {create_access_token(username)}"} for username, _ in users}
+    last_page = max(1, -(-len(users[0][1]) // PAGE_SIZE))
+    created: List[Tuple[str, int]] = []
+
+    def user(i: int) -> Tuple[str, List[int]]:
+        return users[i % len(users)]
+
+    def with_task(method: str, path: str, **kwargs) -> Callable[[int], Tuple[str, str, dict]]:
+        def make(i: int):
+            username, task_ids = user(i)
+            return method, path.format(id=rng.choice(task_ids)), dict(headers=headers[username], **kwargs)
+        return make
+
+    def remember_created(i: int, response: httpx.Response) -> None:
+        created.append((user(i)[0], response.json()["id"]))
+
+    def delete_created(i: int):
+        username, task_id = created[i]
+        return "DELETE", f"/api/tasks/{task_id}", dict(headers=headers[username])
+
+    operations = {
+        "login": (args.login_requests, lambda i: ("POST", "/api/auth/login", dict(data={"username": user(i)[0], "password": BENCH_PASSWORD})), None),
+        "list_first": (args.requests, lambda i: ("GET", "/api/tasks/", dict(params={"size": PAGE_SIZE}, headers=headers[user(i)[0]])), None),
+        "list_deep": (args.requests, lambda i: ("GET", "/api/tasks/", dict(params={"size": PAGE_SIZE, "page": last_page}, headers=headers[user(i)[0]])), None),
+        "detail": (args.requests, with_task("GET", "/api/tasks/{id}"), None),
+        "create": (args.requests, lambda i: ("POST", "/api/tasks/", dict(json={"title": f"Bench created {i}"}, headers=headers[user(i)[0]])), remember_created),
+        "update": (args.requests, with_task("PUT", "/api/tasks/{id}", json={"description": "Updated by the benchmark"}), None),
+        "complete": (args.requests, with_task("PATCH", "/api/tasks/{id}/complete"), None),
+        "delete": (None, delete_created, None),
+    }
+    transport = httpx.ASGITransport(app=_load_app()) if args.url is None else None
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url=args.url or "http://bench", timeout=60) as client:
+        for name in args.operations:
+            count, make_request, on_response = operations[name]
+            if count is None:
+                count = len(created)
+            results[name] = await run_operation(client, count, args.concurrency, make_request, on_response)
+            logger.info("%-10s %s", name, results[name])
+    return results
+
+
+def _load_app():
+    from app.main import app
+    return app
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": session.engine.dialect.name,
+        "target": args.url or "in-process",
+        "users": args.users,
+        "tasks_per_user": args.tasks_per_user,
+        "seeded": not args.skip_seed,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "settings": {
+            name: getattr(settings, name)
+            for name in ("BCRYPT_ROUNDS", "FAST_JSON_RESPONSES", "PRINCIPAL_CACHE_SIZE", "TASK_QUERY_SINGLE_FLIGHT",
+                         "TASK_QUERY_CACHE_TTL_SECONDS", "DB_POOL_SIZE", "DB_MAX_OVERFLOW")
+        },
+    }
+
+
+def compare(results: dict, baseline: dict) -> None:
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not current.get("requests") or not before.get("requests"):
+            continue
+        changes = ", ".join(
+            f"{key} {before[key]} -> {current[key]} ({(current[key] - before[key]) / before[key] * 100:+.1f}%)"
+            for key in ("p50_ms", "p95_ms", "p99_ms", "rps") if before[key]
+        )
+        logger.info("%-10s %s", name, changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=1000)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the bench users of an earlier run")
+    parser.add_argument("--url", help="server to drive instead of the in-process app")
+    parser.add_argument("--database-url", help="database to seed and serve in process instead of DATABASE_URL")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="requests per operation")
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--seed", type=int, default=0, help="random seed for picking tasks")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+    if args.database_url:
+        configure_database(args.database_url)
+    if not args.skip_seed:
+        seed(args.users, args.tasks_per_user)
+    report = {"metadata": metadata(args), "results": asyncio.run(bench(args))}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info("Results written to %s", args.output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report["results"], json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Microbenchmark of per-page serialization cost for the task list endpoints.
+
+Compares FastAPI's response_model path over ORM ``Task`` objects, rendered
+with the stdlib JSON encoder and with orjson, against the FAST_JSON_RESPONSES
+path that encodes ``TASK_ROW_COLUMNS`` rows with orjson. Pages are read from
+an in-memory SQLite database, so ORM hydration is part of the measured cost
+and no server is needed. Usage::
+
+    python -m scripts.bench_serialization --size 100 --rounds 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from app.db.base import Base
+from app.tasks.crud import task_crud
+from app.tasks.models import Task
+from app.tasks.schemas import PaginatedResponse, TaskResponse, TaskStatus
+from app.users.models import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def seeded_session(size: int) -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    statuses = list(TaskStatus)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, first_name="Bench", username="bench", hashed_password="x"))
+        conn.execute(insert(Task), [
+            {"title": f"Task number {i}", "description": "Lorem ipsum dolor sit amet " * 8,
+             "status": statuses[i % len(statuses)], "user_id": 1}
+            for i in range(size)
+        ])
+    return Session(bind=engine)
+
+
+def page(items: list, size: int) -> dict:
+    return dict(items=items, total=10 * size, page=1, pages=10, size=size,
+                has_next=True, has_prev=False, next_cursor=None)
+
+
+async def response_model_path(db: Session, field, size: int, response_class) -> bytes:
+    tasks = task_crud.get_user_tasks(db, user_id=1, limit=size)
+    body = await serialize_response(field=field, response_content=PaginatedResponse(**page(tasks, size)))
+    return response_class(body).body
+
+
+async def fast_path(db: Session, size: int) -> bytes:
+    rows = task_crud.get_user_tasks(db, user_id=1, limit=size, as_rows=True)
+    return ORJSONResponse(page([row._asdict() for row in rows], size)).body
+
+
+async def bench(size: int, rounds: int) -> None:
+    db = seeded_session(size)
+    field = create_model_field(name="Response", type_=PaginatedResponse[TaskResponse], mode="serialization")
+    cases = {
+        "response_model + json": lambda: response_model_path(db, field, size, JSONResponse),
+        "response_model + orjson": lambda: response_model_path(db, field, size, ORJSONResponse),
+        "rows + orjson": lambda: fast_path(db, size),
+    }
+    for name, case in cases.items():
+        await case()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # a fresh identity map per page, like a new request session
+            db.expunge_all()
+            await case()
+        per_page = (time.perf_counter() - start) / rounds
+        logger.info("%-24s %8.1f us/page", name, per_page * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(bench(args.size, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Fail if a TaskCRUD query falls back to a sequential scan of ``tasks``.
+
+Seeds users and tasks inside a transaction on the PostgreSQL database from
+``DATABASE_URL``, runs ANALYZE, executes every TaskCRUD read path, and runs
+``EXPLAIN`` on the SQL each one emits. The transaction is rolled back at the
+end, so the database is left untouched. Usage::
+
+    python -m scripts.check_query_plans --users 200 --tasks-per-user 500
+
+``count_all_tasks`` is not checked: counting the whole table is a full scan
+whatever indexes exist.
+"""
+import argparse
+import logging
+import random
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+from app.db.base import Base
+from app.db.session import engine
+from app.tasks.crud import task_crud
+from app.tasks.models import Task
+from app.tasks.schemas import TaskStatus
+from app.users.models import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUERIES = {
+    "get_user_tasks": lambda db, uid, mid: task_crud.get_user_tasks(db, user_id=uid),
+    "get_user_tasks(deep page)": lambda db, uid, mid: task_crud.get_user_tasks(db, user_id=uid, skip=400, limit=10),
+    "get_user_tasks(status)": lambda db, uid, mid: task_crud.get_user_tasks(db, user_id=uid, status=TaskStatus.IN_PROGRESS),
+    "get_user_tasks(cursor)": lambda db, uid, mid: task_crud.get_user_tasks(db, user_id=uid, after_id=mid),
+    "get_all_tasks": lambda db, uid, mid: task_crud.get_all_tasks(db),
+    "get_all_tasks(cursor)": lambda db, uid, mid: task_crud.get_all_tasks(db, after_id=mid),
+    "get_tasks_by_status": lambda db, uid, mid: task_crud.get_tasks_by_status(db, status=TaskStatus.COMPLETED),
+    "get_task_by_id": lambda db, uid, mid: task_crud.get_task_by_id(db, mid),
+    "count_user_tasks": lambda db, uid, mid: task_crud.count_user_tasks(db, user_id=uid),
+    "count_user_tasks(status)": lambda db, uid, mid: task_crud.count_user_tasks(db, user_id=uid, status=TaskStatus.NEW),
+    "get_task_changes": lambda db, uid, mid: task_crud.get_task_changes(db, user_id=uid, since=mid, limit=50),
+    "get_user_tasks(archived)": lambda db, uid, mid: task_crud.get_user_tasks(db, user_id=uid, status=TaskStatus.COMPLETED, limit=10, include_archived=True),
+    "count_user_tasks(archived)": lambda db, uid, mid: task_crud.count_user_tasks(db, user_id=uid, include_archived=True),
+    "search_user_tasks": lambda db, uid, mid: task_crud.search_user_tasks(db, user_id=uid, query="task 42"),
+    "search_user_tasks(cursor)": lambda db, uid, mid: task_crud.search_user_tasks(db, user_id=uid, query="task", after=(0.1, mid)),
+    "get_status_counts": lambda db, uid, mid: task_crud.get_status_counts(db, user_id=uid),
+    "archive_completed_tasks": lambda db, uid, mid: task_crud.archive_completed_tasks(db, datetime.now(timezone.utc) - timedelta(days=300), batch_size=100),
+}
+
+
+@contextmanager
+def capture_statements(conn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(conn, "before_cursor_execute", record)
+
+
+def seq_scans(node: dict) -> list:
+    found = []
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") == Task.__tablename__:
+        found.append(node)
+    for child in node.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def seed(conn, users: int, tasks_per_user: int) -> None:
+    statuses = list(TaskStatus)
+    now = datetime.now(timezone.utc)
+    for u in range(users):
+        user_id = conn.execute(
+            insert(User).values(first_name="Plan", username=f"plan_check_{u}", hashed_password="x").returning(User.id)
+        ).scalar_one()
+        rows = [{"title": f"task {i}", "status": random.choice(statuses), "user_id": user_id, "revision": i} for i in range(tasks_per_user)]
+        for row in rows:
+            row["completed_at"] = now - timedelta(days=random.randrange(365)) if row["status"] == TaskStatus.COMPLETED else None
+        conn.execute(insert(Task), rows)
+    conn.exec_driver_sql(f"ANALYZE {User.__tablename__}")
+    conn.exec_driver_sql(f"ANALYZE {Task.__tablename__}")
+
+
+def check(users: int, tasks_per_user: int) -> int:
+    if engine.dialect.name != "postgresql":
+        logger.error("Query plans can only be checked on PostgreSQL, got %s", engine.dialect.name)
+        return 2
+    Base.metadata.create_all(bind=engine)
+    failures = 0
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            seed(conn, users, tasks_per_user)
+            user_id, mid_id = conn.execute(
+                select(Task.user_id, Task.id).order_by(Task.id).offset(users * tasks_per_user // 2).limit(1)
+            ).one()
+            db = Session(bind=conn, join_transaction_mode="create_savepoint")
+            for name, run in QUERIES.items():
+                with capture_statements(conn) as statements:
+                    run(db, user_id, mid_id)
+                db.expunge_all()
+                for statement, parameters in statements:
+                    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                    scans = seq_scans(plan[0]["Plan"])
+                    if scans:
+                        failures += 1
+                        logger.error("%s: sequential scan on %s\n%s", name, Task.__tablename__, statement)
+                    else:
+                        logger.info("%s: ok", name)
+        finally:
+            trans.rollback()
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-user", type=int, default=500)
+    args = parser.parse_args()
+    sys.exit(check(args.users, args.tasks_per_user))
+
+if __name__ == "__main__":
+    main()
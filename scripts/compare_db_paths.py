@@ -0,0 +1,107 @@
+"""Load comparison of the sync and async database paths.
+
+Runs the queries behind ``GET /api/tasks`` (page + count) from many concurrent
+coroutines on one event loop, first through the sync ``Session`` the endpoints
+used to call directly, then through ``AsyncSession``. Usage::
+
+    python -m scripts.compare_db_paths --requests 500 --concurrency 50 --db-latency-ms 5
+
+``--db-latency-ms`` adds a ``pg_sleep`` to every request to emulate a remote
+database (PostgreSQL only). The async path is measured with the task query
+cache bypassed, like for like with the sync path, and again as the API serves
+it, with identical concurrent queries coalesced (TASK_QUERY_SINGLE_FLIGHT).
+"""
+import argparse
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+from sqlalchemy import text
+from app.core.cache import task_query_cache
+from app.db.base import Base
+from app.db.session import engine, SessionLocal, AsyncSessionLocal
+from app.tasks.crud import task_crud, async_task_crud
+from app.users.crud import user_crud
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCH_USERNAME = "db_paths_bench"
+
+
+def seed(tasks: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = user_crud.get_user_by_username(db, BENCH_USERNAME)
+        if user is None:
+            user = user_crud.create_user(db, first_name="Bench", username=BENCH_USERNAME, password="benchpassword")
+        missing = tasks - task_crud.count_user_tasks(db, user_id=user.id)
+        for i in range(max(missing, 0)):
+            db.add(app.tasks.models.Task(title=f"bench task {i}", user_id=user.id))
+        db.commit()
+        return user.id
+
+
+async def sync_request(user_id: int, latency: float) -> None:
+    # what the endpoints did before: a blocking Session call inside a coroutine
+    with SessionLocal() as db:
+        if latency:
+            db.execute(text("SELECT pg_sleep(:s)"), {"s": latency})
+        task_crud.get_user_tasks(db, user_id=user_id, limit=10)
+        task_crud.count_user_tasks(db, user_id=user_id)
+
+
+async def async_request(user_id: int, latency: float) -> None:
+    async with AsyncSessionLocal() as db:
+        if latency:
+            await db.execute(text("SELECT pg_sleep(:s)"), {"s": latency})
+        await async_task_crud.get_user_tasks(db, user_id=user_id, limit=10)
+        await async_task_crud.count_user_tasks(db, user_id=user_id)
+
+
+@contextmanager
+def query_cache_bypassed():
+    single_flight, ttl = task_query_cache.single_flight, task_query_cache.ttl
+    task_query_cache.single_flight, task_query_cache.ttl = False, 0
+    try:
+        yield
+    finally:
+        task_query_cache.single_flight, task_query_cache.ttl = single_flight, ttl
+
+
+async def run(request, user_id: int, requests: int, concurrency: int, latency: float) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await request(user_id, latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start
+
+
+async def compare(args) -> None:
+    user_id = seed(args.tasks)
+    latency = args.db_latency_ms / 1000
+    with query_cache_bypassed():
+        results = [(name, await run(request, user_id, args.requests, args.concurrency, latency))
+                   for name, request in (("sync", sync_request), ("async", async_request))]
+    results.append(("async coalesced", await run(async_request, user_id, args.requests, args.concurrency, latency)))
+    for name, elapsed in results:
+        logger.info("%-15s path: %d requests in %.2fs -> %.0f req/s", name, args.requests, elapsed, args.requests / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    asyncio.run(compare(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Recount task_status_counts from the tasks and archived_tasks tables.
+
+The API keeps the counts served by GET /api/tasks/stats up to date in every
+write; this repairs them should they drift, e.g. after tasks were changed
+with SQL by hand. Each batch of ``--batch-size`` users is recounted in one
+transaction that holds their rows locked, so it can run while the API serves
+traffic. Usage::
+
+    python -m scripts.rebuild_task_stats
+    python -m scripts.rebuild_task_stats --username alice
+"""
+import argparse
+import itertools
+import logging
+import time
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+from sqlalchemy import select
+from app.db.session import SessionLocal
+from app.tasks.crud import task_crud
+from app.users.models import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run(args) -> int:
+    total = 0
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        query = select(User.id).order_by(User.id)
+        if args.username:
+            query = query.where(User.username == args.username)
+        user_ids = db.scalars(query).all()
+        if args.username and not user_ids:
+            raise SystemExit(f"User {args.username} not found")
+        user_ids = iter(user_ids)
+        while batch := list(itertools.islice(user_ids, args.batch_size)):
+            task_crud.rebuild_status_counts(db, batch)
+            total += len(batch)
+            logger.info("%d users recounted", total)
+    logger.info("Rebuilt task status counts of %d users in %.1f s", total, time.perf_counter() - start)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--username", help="only recount this user's tasks")
+    parser.add_argument("--batch-size", type=int, default=100, help="users recounted per transaction")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
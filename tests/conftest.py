@@ -0,0 +1,56 @@
+import os
+
+# Settings and the engines are built when the app is imported, so the test
+# environment has to be in place first. Each worker process gets its own
+# in-memory database, no PostgreSQL needed: pytest -n auto runs the suite on
+# every core.
+TEST_DATABASE_URL = "sqlite:///file:todo-tests?mode=memory&cache=shared&uri=true"
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ.setdefault("SECRET_KEY", "test-secret-key-not-used-outside-the-test-suite")
+# the lowest cost bcrypt accepts keeps registering and logging in cheap
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("DB_POOL_WARMUP", "false")
+
+import pytest
+from fastapi.testclient import TestClient
+from app.core.cache import principal_cache, task_query_cache
+from app.db import session
+from app.db.base import Base
+from app.db.session import TimedAsyncQueuePool, configure_database
+import app.users.models  # noqa: F401
+import app.tasks.models  # noqa: F401
+
+# aiosqlite connections are not tied to an event loop, so unlike asyncpg ones
+# they can be pooled across the loops TestClient starts for every request
+configure_database(TEST_DATABASE_URL, async_poolclass=TimedAsyncQueuePool)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_connection():
+    # an in-memory database lives as long as a connection to it
+    with session.engine.connect() as connection:
+        yield connection
+
+
+@pytest.fixture(autouse=True)
+def database(database_connection):
+    """Every test starts from empty tables and caches."""
+    principal_cache.clear()
+    task_query_cache.clear()
+    Base.metadata.create_all(bind=session.engine)
+    yield
+    Base.metadata.drop_all(bind=session.engine)
+
+
+@pytest.fixture
+def register_user():
+    """Registers and logs in a user by name, returning their Authorization header."""
+    from app.main import app
+    client = TestClient(app)
+
+    def register(username: str) -> dict:
+        password = f"{username}-password"
+        client.post("/api/auth/register", json={"username": username, "password": password, "first_name": username.title()})
+        token = client.post("/api/auth/login", data={"username": username, "password": password}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+    return register
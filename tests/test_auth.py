@@ -1,38 +1,20 @@
+import bcrypt
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.db.base import Base
-from app.db.session import get_db
-
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture(scope="session", autouse=True)
-def setup_database():
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
+from app.db.session import SessionLocal
+from app.core.config import settings
+from app.core.security import pwd_context
+from app.users.models import User
 
 @pytest.fixture
 def db_session():
-    session = TestingSessionLocal()
-    try:
-        yield session
-    finally:
-        session.close()
-
-def override_get_db():
-    session = TestingSessionLocal()
+    session = SessionLocal()
     try:
         yield session
     finally:
         session.close()
 
-app.dependency_overrides[get_db] = override_get_db
-
 client = TestClient(app)
 
 REGISTER_URL = "/api/auth/register"
@@ -108,4 +90,22 @@ def test_login_nonexistent_user():
     }
     response = client.post(LOGIN_URL, data=login_data)
     assert response.status_code == 401
-    assert response.json()["detail"] == "Incorrect username or password"
\ No newline at end of file
+    assert response.json()["detail"] == "Incorrect username or password"
+
+def test_login_rehashes_outdated_password_cost(db_session):
+    payload = {
+        "first_name": "Old",
+        "last_name": "Hash",
+        "username": "oldhash",
+        "password": "oldhashpassword"
+    }
+    client.post(REGISTER_URL, json=payload)
+    user = db_session.query(User).filter(User.username == "oldhash").one()
+    user.hashed_password = bcrypt.hashpw(b"oldhashpassword", bcrypt.gensalt(settings.BCRYPT_ROUNDS + 1)).decode()
+    db_session.commit()
+
+    response = client.post(LOGIN_URL, data={"username": "oldhash", "password": "oldhashpassword"})
+    assert response.status_code == 200
+    db_session.refresh(user)
+    assert user.hashed_password.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert pwd_context.verify("oldhashpassword", user.hashed_password)
@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+from app.main import app
+from app.core.config import settings
+
+client = TestClient(app)
+
+
+def test_internal_metrics_require_token(monkeypatch):
+    assert client.get("/api/internal/metrics").status_code == 404
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", SecretStr("internal-secret"))
+    assert client.get("/api/internal/metrics", headers={"X-Internal-Token": "wrong"}).status_code == 404
+
+    resp = client.get("/api/internal/metrics", headers={"X-Internal-Token": "internal-secret"})
+    assert resp.status_code == 200
+    pools = resp.json()["pools"]
+    assert {"size", "checked_out", "overflow", "wait_seconds_max"} <= set(pools["async"])
+
+
+def test_prometheus_metrics_record_routes():
+    client.get("/api/")
+    client.get("/api/no-such-path")
+    body = client.get("/metrics").text
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/",status="200"}' in body
+    assert 'route="unmatched",status="404"' in body
+    assert 'db_pool_checked_out{engine="async"}' in body
+
+
+def test_profiling_middleware_profiles_only_authorized_requests(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from app.core.profiling import ProfilingMiddleware
+
+    profiled_app = FastAPI()
+    profiled_app.add_middleware(ProfilingMiddleware, directory=tmp_path)
+
+    @profiled_app.get("/work")
+    def work():
+        return {"total": sum(range(1000))}
+
+    profiled_client = TestClient(profiled_app)
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", SecretStr("internal-secret"))
+    resp = profiled_client.get("/work", headers={"X-Profile": "1"})
+    assert "x-profile-file" not in resp.headers
+
+    resp = profiled_client.get("/work", headers={"X-Profile": "1", "X-Internal-Token": "internal-secret"})
+    assert resp.json() == {"total": 499500}
+    assert (tmp_path / resp.headers["x-profile-file"]).stat().st_size > 0
@@ -0,0 +1,59 @@
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.cache import PrincipalCache, principal_cache
+from app.db.base import Base
+from app.users.models import User
+import app.tasks.models  # noqa: F401
+
+
+def make_user(username: str) -> User:
+    return User(id=1, first_name="Cache", username=username, hashed_password="x")
+
+
+def test_hit_and_miss_counters():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    assert cache.get("token") is None
+    user = make_user("alice")
+    cache.put("token", user, time.time() + 60)
+    assert cache.get("token") is user
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_entry_never_outlives_token_expiry():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.put("token", make_user("alice"), time.time() - 1)
+    assert cache.get("token") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    expires = time.time() + 60
+    cache.put("a", make_user("a"), expires)
+    cache.put("b", make_user("b"), expires)
+    cache.get("a")
+    cache.put("c", make_user("c"), expires)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_password_change_and_delete_invalidate_entries():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        user = User(first_name="Cache", username="cached", hashed_password="old")
+        db.add(user)
+        db.commit()
+
+        principal_cache.put("token", user, time.time() + 60)
+        user.hashed_password = "new"
+        db.commit()
+        assert principal_cache.get("token") is None
+
+        principal_cache.put("token", user, time.time() + 60)
+        db.delete(user)
+        db.commit()
+        assert principal_cache.get("token") is None
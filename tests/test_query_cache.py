@@ -0,0 +1,83 @@
+import asyncio
+from app.core.cache import SingleFlightCache
+
+
+class CountingQuery:
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        if self.release is not None:
+            await self.release.wait()
+        return [call]
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    async def run():
+        cache = SingleFlightCache(maxsize=10, ttl=0)
+        query = CountingQuery()
+        query.release = asyncio.Event()
+        calls = [asyncio.create_task(cache.run("page-1", 1, query)) for _ in range(5)]
+        await asyncio.sleep(0)
+        query.release.set()
+        results = await asyncio.gather(*calls)
+        assert query.calls == 1
+        assert all(result is results[0] for result in results)
+        assert cache.stats() == {"size": 0, "hits": 0, "misses": 1, "coalesced": 4}
+        await cache.run("page-1", 1, query)
+        assert query.calls == 2
+    asyncio.run(run())
+
+
+def test_cached_results_are_dropped_on_invalidate():
+    async def run():
+        cache = SingleFlightCache(maxsize=10, ttl=60)
+        query = CountingQuery()
+        assert await cache.run("page-1", 1, query) == [1]
+        assert await cache.run("page-1", 1, query) == [1]
+        await cache.run("count", None, query)
+        cache.invalidate(1)
+        assert await cache.run("page-1", 1, query) == [3]
+        assert await cache.run("count", None, query) == [2]
+        assert cache.stats()["hits"] == 2
+    asyncio.run(run())
+
+
+def test_invalidate_detaches_calls_in_flight():
+    async def run():
+        cache = SingleFlightCache(maxsize=10, ttl=60)
+        query = CountingQuery()
+        query.release = asyncio.Event()
+        stale = asyncio.create_task(cache.run("page-1", 1, query))
+        await asyncio.sleep(0)
+        # a write commits while the first query runs
+        cache.invalidate(1)
+        fresh = asyncio.create_task(cache.run("page-1", 1, query))
+        await asyncio.sleep(0)
+        query.release.set()
+        assert await stale == [1]
+        assert await fresh == [2]
+        # only the result read after the write is cached
+        assert await cache.run("page-1", 1, query) == [2]
+    asyncio.run(run())
+
+
+def test_failure_reaches_every_waiter():
+    async def run():
+        cache = SingleFlightCache(maxsize=10, ttl=60)
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("database went away")
+
+        calls = [asyncio.create_task(cache.run("page-1", 1, failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert cache.stats()["size"] == 0
+    asyncio.run(run())
@@ -0,0 +1,109 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.cache import principal_cache
+from app.db import session
+from app.db.base import Base
+from app.db.routing import RoutingSession, ReplicaRouter
+from app.db.session import TimedAsyncQueuePool, to_async_url
+from app.main import app
+from app.tasks.models import Task
+from app.users.models import User
+
+# a second in-memory database stands in for a replica that has not caught up
+REPLICA_URL = "sqlite:///file:todo-tests-replica?mode=memory&cache=shared&uri=true"
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def replica():
+    engine = create_engine(REPLICA_URL)
+    with engine.connect():
+        Base.metadata.create_all(bind=engine)
+        yield engine
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def router(replica, monkeypatch):
+    router = ReplicaRouter([create_async_engine(to_async_url(REPLICA_URL))], sticky_seconds=60, max_lag_seconds=5)
+    monkeypatch.setattr(session, "replica_router", router)
+    return router
+
+
+def replicate_user(replica, username: str) -> int:
+    with session.SessionLocal() as db:
+        user = db.scalars(select(User).where(User.username == username)).one()
+        row = {column.name: getattr(user, column.name) for column in User.__table__.columns}
+    with replica.begin() as connection:
+        connection.execute(insert(User), row)
+    return row["id"]
+
+
+def test_reads_go_to_replica_until_the_user_writes(replica, router, register_user):
+    headers = register_user("replicated")
+    user_id = replicate_user(replica, "replicated")
+    with replica.begin() as connection:
+        connection.execute(insert(Task), {"title": "Only on the replica", "user_id": user_id, "revision": 1})
+
+    titles = [t["title"] for t in client.get("/api/tasks/", headers=headers).json()["items"]]
+    assert titles == ["Only on the replica"]
+
+    client.post("/api/tasks/", json={"title": "Written to the primary"}, headers=headers)
+    titles = [t["title"] for t in client.get("/api/tasks/", headers=headers).json()["items"]]
+    assert titles == ["Written to the primary"]
+    assert router.stats()["primary_reads"] == 1
+
+    router.sticky_seconds = 0
+    titles = [t["title"] for t in client.get("/api/tasks/", headers=headers).json()["items"]]
+    assert titles == ["Only on the replica"]
+
+
+def test_session_reads_its_own_writes_from_the_primary(replica, router):
+    async def run():
+        async with session.AsyncSessionLocal(info={"replica": router.engines[0]}) as db:
+            assert isinstance(db.sync_session, RoutingSession)
+            db.add(User(first_name="Primary", username="primary", hashed_password="x"))
+            assert await db.scalar(select(User.username)) is None
+            await db.flush()
+            assert await db.scalar(select(User.username)) == "primary"
+            await db.rollback()
+    asyncio.run(run())
+
+
+def test_unreachable_replica_falls_back_to_primary(tmp_path):
+    missing = f"sqlite+aiosqlite:///{tmp_path}/no-such-dir/replica.db"
+    router = ReplicaRouter([create_async_engine(missing)], sticky_seconds=0, max_lag_seconds=5)
+    assert router.reader(1) is router.engines[0]
+    asyncio.run(router.check_lag())
+    assert router.lag == [None]
+    assert router.reader(1) is None
+
+
+class SmallPool(TimedAsyncQueuePool):
+    def __init__(self, creator, **kw):
+        super().__init__(creator, **{"pool_size": 2, "max_overflow": 1, "timeout": 5, **kw})
+
+
+def test_concurrent_reads_need_one_connection_each(register_user, monkeypatch):
+    headers = register_user("pooled")
+    # every request looks its user up, as with cold tokens
+    monkeypatch.setattr(principal_cache, "maxsize", 0)
+    small = create_async_engine(to_async_url(session.engine.url.render_as_string(hide_password=False)), poolclass=SmallPool)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as pooled_client:
+            responses = await asyncio.gather(*(pooled_client.get("/api/tasks/", headers=headers) for _ in range(8)))
+        await small.dispose()
+        return [response.status_code for response in responses]
+
+    session.AsyncSessionLocal.configure(bind=small)
+    try:
+        assert asyncio.run(run()) == [200] * 8
+    finally:
+        session.AsyncSessionLocal.configure(bind=session.async_engine)
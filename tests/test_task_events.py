@@ -0,0 +1,143 @@
+import asyncio
+import json
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.api.endpoints.tasks import stream_task_events
+from app.core.pubsub import Broker
+from app.db.base import Base
+from app.db.session import SessionLocal
+from app.main import app as application
+from app.tasks.crud import task_crud
+from app.tasks import events
+from app.tasks.events import TaskEventListener, task_event_broker
+from app.users.models import User
+import app.tasks.models  # noqa: F401
+
+
+def test_publish_fans_out_to_channel_subscribers():
+    async def run():
+        broker = Broker(queue_size=10)
+        with broker.subscribe(1) as first, broker.subscribe(1) as second, broker.subscribe(2) as other:
+            broker.publish(1, "hello")
+            assert await first.get() == "hello"
+            assert await second.get() == "hello"
+            await asyncio.sleep(0)
+            assert other.queue.empty()
+        assert broker.stats()["subscribers"] == 0
+    asyncio.run(run())
+
+
+def test_slow_subscriber_is_evicted():
+    async def run():
+        broker = Broker(queue_size=2)
+        subscription = broker.subscribe(1)
+        for i in range(3):
+            broker.publish(1, str(i))
+        await asyncio.sleep(0)
+        assert await subscription.get() is None
+        assert subscription.evicted
+        assert broker.stats() == {"subscribers": 0, "published": 3, "evictions": 1}
+    asyncio.run(run())
+
+
+def test_events_are_published_on_commit_only():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    async def run():
+        with Session() as db:
+            user = User(first_name="Events", username="events", hashed_password="x")
+            db.add(user)
+            db.commit()
+            with task_event_broker.subscribe(user.id) as subscription:
+                task, _ = task_crud.create_task(db, title="Pushed", user_id=user.id)
+                task_crud.update_task(db, task_id=task.id + 1, user_id=user.id, title="Missing")
+                task_crud.delete_task(db, task_id=task.id, user_id=user.id)
+                await asyncio.sleep(0)
+                frames = [await subscription.get() for _ in range(2)]
+                assert subscription.queue.empty()
+        created, deleted = (json.loads(frame.split("data: ")[1]) for frame in frames)
+        assert frames[0].startswith(f"event: created\nid: {created['revision']}\n")
+        assert created["ids"] == [task.id]
+        assert deleted == {"type": "deleted", "revision": created["revision"] + 1, "ids": [task.id]}
+    asyncio.run(run())
+
+
+def test_stream_endpoint_sends_committed_writes(register_user):
+    headers = register_user("streamer")
+    with SessionLocal() as db:
+        user_id = db.scalar(select(User.id).where(User.username == "streamer"))
+
+    async def run():
+        # TestClient waits for the whole body, which an event stream never ends, so drive the app directly
+        chunks = asyncio.Queue()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                await chunks.put(message.get("body", b"").decode())
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/api/tasks/stream", "raw_path": b"/api/tasks/stream", "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"testserver"), (b"authorization", headers["Authorization"].encode())],
+            "client": ("testclient", 50000), "server": ("testserver", 80),
+        }
+        served = asyncio.create_task(application(scope, receive, send))
+        assert await asyncio.wait_for(chunks.get(), 5) == ": connected\n\n"
+        with SessionLocal() as db:
+            task_id = task_crud.create_task(db, title="Streamed", user_id=user_id)[0].id
+        frame = await asyncio.wait_for(chunks.get(), 5)
+        assert frame.startswith("event: created\n")
+        assert json.loads(frame.split("data: ")[1])["ids"] == [task_id]
+
+        disconnected.set()
+        await asyncio.wait_for(served, 5)
+        assert task_event_broker.stats()["subscribers"] == 0
+
+        # a response that is never streamed, e.g. the client went away first, holds no subscription
+        with SessionLocal() as db:
+            await stream_task_events(current_user=db.get(User, user_id))
+        assert task_event_broker.stats()["subscribers"] == 0
+    asyncio.run(run())
+
+
+def test_listener_reconnects_and_resets_subscribers(monkeypatch):
+    class FakeConnection:
+        def __init__(self):
+            self.listening = []
+
+        async def add_listener(self, channel, callback):
+            self.listening.append(channel)
+
+        def add_termination_listener(self, callback):
+            pass
+
+    attempts = []
+
+    async def connect(dsn):
+        attempts.append(dsn)
+        if len(attempts) == 2:
+            raise ConnectionRefusedError("database restarting")
+        return FakeConnection()
+
+    monkeypatch.setattr(events.asyncpg, "connect", connect)
+    monkeypatch.setattr(events, "RECONNECT_MIN_SECONDS", 0)
+
+    async def run():
+        listener = TaskEventListener("postgresql://localhost/todoapp")
+        await listener.start()
+        with task_event_broker.subscribe(1) as subscription:
+            listener._on_terminated(listener.connection)
+            assert listener.connection is None
+            await listener._reconnecting
+            assert await subscription.get() == events.RESET_MESSAGE
+        assert len(attempts) == 3
+        assert listener.connection.listening == [events.NOTIFY_CHANNEL]
+    asyncio.run(run())
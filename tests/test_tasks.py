@@ -1,6 +1,16 @@
+import csv
+import io
+import json
 import pytest
+from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.tasks.crud import task_crud
+from app.tasks.models import TaskStatus
+from app.users.models import User
 
 client = TestClient(app)
 
@@ -21,11 +31,16 @@ def get_auth_token():
     assert response.status_code == 200
     return response.json()["access_token"]
 
-@pytest.fixture(scope="module")
+@pytest.fixture
 def auth_header():
     token = get_auth_token()
     return {"Authorization": f"Bearer {token}"}
 
+@pytest.fixture
+def task_id(auth_header):
+    resp = client.post("/api/tasks/", json={"title": "Existing task"}, headers=auth_header)
+    return resp.json()["id"]
+
 
 def test_create_task(auth_header):
     data = {
@@ -38,8 +53,6 @@ def test_create_task(auth_header):
     res = resp.json()
     assert res["title"] == "My test task"
     assert res["status"] == "NEW"
-    global created_task_id
-    created_task_id = res["id"]
 
 def test_get_tasks(auth_header):
     resp = client.get("/api/tasks/", headers=auth_header)
@@ -48,9 +61,7 @@ def test_get_tasks(auth_header):
     assert "items" in data
     assert data["page"] == 1
 
-def test_update_task(auth_header):
-    resp = client.get("/api/tasks/", headers=auth_header)
-    task_id = resp.json()["items"][0]["id"]
+def test_update_task(auth_header, task_id):
     update_data = {
         "title": "Updated task title"
     }
@@ -58,16 +69,306 @@ def test_update_task(auth_header):
     assert resp.status_code == 200
     assert resp.json()["title"] == "Updated task title"
 
-def test_mark_complete(auth_header):
-    resp = client.get("/api/tasks/", headers=auth_header)
-    task_id = resp.json()["items"][0]["id"]
+def test_mark_complete(auth_header, task_id):
     resp = client.patch(f"/api/tasks/{task_id}/complete", headers=auth_header)
     assert resp.status_code == 200
     assert resp.json()["status"] == "COMPLETED"
 
-def test_delete_task(auth_header):
-    resp = client.get("/api/tasks/", headers=auth_header)
-    task_id = resp.json()["items"][0]["id"]
+def test_delete_task(auth_header, task_id):
     resp = client.delete(f"/api/tasks/{task_id}", headers=auth_header)
     assert resp.status_code == 200
-    assert resp.json()["message"] == "Task deleted"
\ No newline at end of file
+    assert resp.json()["message"] == "Task deleted"
+
+def test_cursor_pagination(auth_header):
+    created_ids = []
+    for i in range(3):
+        resp = client.post("/api/tasks/", json={"title": f"Cursor task {i}"}, headers=auth_header)
+        created_ids.append(resp.json()["id"])
+    seen = []
+    resp = client.get("/api/tasks/", params={"size": 2}, headers=auth_header)
+    while True:
+        assert resp.status_code == 200
+        data = resp.json()
+        seen.extend(item["id"] for item in data["items"])
+        if data["next_cursor"] is None:
+            assert data["has_next"] is False
+            break
+        resp = client.get("/api/tasks/", params={"size": 2, "cursor": data["next_cursor"]}, headers=auth_header)
+    assert seen == sorted(set(seen))
+    assert set(created_ids) <= set(seen)
+
+def test_invalid_cursor(auth_header):
+    resp = client.get("/api/tasks/", params={"cursor": "not-a-cursor"}, headers=auth_header)
+    assert resp.status_code == 400
+
+def test_get_tasks_without_total(auth_header):
+    resp = client.get("/api/tasks/", params={"include_total": "false"}, headers=auth_header)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total"] is None
+    assert data["pages"] is None
+    assert "items" in data
+
+def test_bulk_create_update_delete(auth_header):
+    items = [{"title": f"Bulk task {i}"} for i in range(3)]
+    resp = client.post("/api/tasks/bulk", json={"items": items}, headers=auth_header)
+    assert resp.status_code == 201
+    results = resp.json()["results"]
+    assert [r["result"] for r in results] == ["SUCCESS"] * 3
+    assert [r["task"]["title"] for r in results] == [item["title"] for item in items]
+    ids = [r["id"] for r in results]
+
+    missing_id = max(ids) + 1000
+    resp = client.patch("/api/tasks/bulk", json={"ids": ids + [missing_id], "status": "COMPLETED"}, headers=auth_header)
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["result"] for r in results] == ["SUCCESS"] * 3 + ["NOT_FOUND"]
+    assert all(r["task"]["status"] == "COMPLETED" for r in results[:3])
+
+    resp = client.request("DELETE", "/api/tasks/bulk", json={"ids": ids + [missing_id]}, headers=auth_header)
+    assert resp.status_code == 200
+    assert [r["result"] for r in resp.json()["results"]] == ["SUCCESS"] * 3 + ["NOT_FOUND"]
+    assert client.get(f"/api/tasks/{ids[0]}", headers=auth_header).status_code == 404
+
+def test_other_user_cannot_modify_task(auth_header, register_user):
+    resp = client.post("/api/tasks/", json={"title": "Private task"}, headers=auth_header)
+    task_id = resp.json()["id"]
+    other_header = register_user("otheruser")
+
+    assert client.put(f"/api/tasks/{task_id}", json={"title": "Stolen"}, headers=other_header).status_code == 403
+    assert client.patch(f"/api/tasks/{task_id}/complete", headers=other_header).status_code == 403
+    assert client.delete(f"/api/tasks/{task_id}", headers=other_header).status_code == 403
+    assert client.delete(f"/api/tasks/{task_id + 1000}", headers=other_header).status_code == 404
+    assert client.get(f"/api/tasks/{task_id}", headers=auth_header).json()["title"] == "Private task"
+
+def test_export_tasks(auth_header):
+    client.post("/api/tasks/", json={"title": "Export, me", "description": "line one\nline two", "status": "IN_PROGRESS"}, headers=auth_header)
+    resp = client.get("/api/tasks/export", params={"status": "IN_PROGRESS"}, headers=auth_header)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert rows and all(row["status"] == "IN_PROGRESS" for row in rows)
+    assert {"title": "Export, me", "description": "line one\nline two"}.items() <= rows[-1].items()
+
+    resp = client.get("/api/tasks/export", params={"format": "csv", "gzip": "true"}, headers=auth_header)
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    records = list(csv.DictReader(io.StringIO(resp.text)))
+    assert any(r["title"] == "Export, me" and r["description"] == "line one\nline two" for r in records)
+
+def test_import_tasks(auth_header):
+    ndjson = '{"title": "Imported 1"}\n{"title": ""}\nnot json\n{"title": "Imported 2", "status": "COMPLETED"}\n'
+    resp = client.post("/api/tasks/import", files={"file": ("tasks.ndjson", ndjson)}, headers=auth_header)
+    assert resp.status_code == 200
+    report = resp.json()
+    assert report["imported"] == 2
+    assert report["failed"] == 2
+    assert [e["line"] for e in report["errors"]] == [2, 3]
+
+    csv_body = 'title,description,status\nImported 3,"multi\nline",IN_PROGRESS\nImported 4,,\n'
+    resp = client.post("/api/tasks/import", params={"format": "csv"}, files={"file": ("tasks.csv", csv_body)}, headers=auth_header)
+    assert resp.json()["imported"] == 2
+    titles = {t["title"]: t for t in client.get("/api/tasks/", params={"size": 100}, headers=auth_header).json()["items"]}
+    assert titles["Imported 2"]["status"] == "COMPLETED"
+    assert titles["Imported 3"]["description"] == "multi\nline"
+    assert titles["Imported 4"]["status"] == "NEW"
+
+    resp = client.post("/api/tasks/import", files={"file": ("tasks.ndjson", b'{"title": "caf\xe9"}\n')}, headers=auth_header)
+    assert resp.status_code == 400
+
+def test_fast_json_list_matches_default(auth_header, monkeypatch):
+    params = {"size": 5}
+    expected = client.get("/api/tasks/", params=params, headers=auth_header).json()
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", True)
+    resp = client.get("/api/tasks/", params=params, headers=auth_header)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.json() == expected
+
+def test_sparse_fieldsets(auth_header):
+    for i in range(3):
+        client.post("/api/tasks/", json={"title": f"Sparse task {i}", "description": "Not loaded"}, headers=auth_header)
+    resp = client.get("/api/tasks/", params={"fields": "title,status", "size": 2}, headers=auth_header)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert all(set(item) == {"id", "title", "status"} for item in data["items"])
+    resp = client.get("/api/tasks/", params={"fields": "title", "size": 2, "cursor": data["next_cursor"]}, headers=auth_header)
+    assert all(set(item) == {"id", "title"} for item in resp.json()["items"])
+
+    resp = client.get("/api/tasks/all", params={"fields": "title,secret"}, headers=auth_header)
+    assert resp.status_code == 400
+
+def test_conditional_get_with_etag(auth_header):
+    resp = client.get("/api/tasks/", headers=auth_header)
+    etag = resp.headers["etag"]
+    assert etag.startswith('W/"')
+    resp = client.get("/api/tasks/", headers={**auth_header, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+
+    task_id = client.post("/api/tasks/", json={"title": "Changes the version"}, headers=auth_header).json()["id"]
+    resp = client.get("/api/tasks/", headers={**auth_header, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+
+    detail = client.get(f"/api/tasks/{task_id}", headers=auth_header)
+    assert detail.status_code == 200
+    resp = client.get(f"/api/tasks/{task_id}", headers={**auth_header, "If-None-Match": detail.headers["etag"]})
+    assert resp.status_code == 304
+    client.patch(f"/api/tasks/{task_id}/complete", headers=auth_header)
+    resp = client.get(f"/api/tasks/{task_id}", headers={**auth_header, "If-None-Match": detail.headers["etag"]})
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "COMPLETED"
+    etag = resp.headers["etag"]
+    assert client.get(f"/api/tasks/{task_id + 1000}", headers={**auth_header, "If-None-Match": etag}).status_code == 404
+
+def test_delta_sync_changes(auth_header):
+    resp = client.get("/api/tasks/changes", headers=auth_header)
+    assert resp.status_code == 200
+    since = resp.json()["revision"]
+    assert client.get("/api/tasks/changes", params={"since": since}, headers=auth_header).json()["changes"] == []
+
+    kept = client.post("/api/tasks/", json={"title": "Synced task"}, headers=auth_header).json()["id"]
+    gone = client.post("/api/tasks/", json={"title": "Deleted task"}, headers=auth_header).json()["id"]
+    client.put(f"/api/tasks/{kept}", json={"status": "IN_PROGRESS"}, headers=auth_header)
+    client.delete(f"/api/tasks/{gone}", headers=auth_header)
+    client.delete("/api/tasks/999999", headers=auth_header)
+
+    data = client.get("/api/tasks/changes", params={"since": since}, headers=auth_header).json()
+    assert [(c["id"], c["deleted"]) for c in data["changes"]] == [(kept, False), (gone, True)]
+    assert data["changes"][0]["task"]["status"] == "IN_PROGRESS"
+    assert data["changes"][1]["task"] is None
+    assert data["revision"] == since + 4
+    assert data["has_more"] is False
+
+    # a bulk write shares one revision and is never split across pages
+    created = client.post("/api/tasks/bulk", json={"items": [{"title": f"Sync {i}"} for i in range(3)]}, headers=auth_header)
+    ids = [r["id"] for r in created.json()["results"]]
+    page = client.get("/api/tasks/changes", params={"since": data["revision"], "limit": 2}, headers=auth_header).json()
+    assert [c["id"] for c in page["changes"]] == ids
+    assert page["has_more"] is True
+    rest = client.get("/api/tasks/changes", params={"since": page["revision"]}, headers=auth_header).json()
+    assert rest["changes"] == [] and rest["has_more"] is False
+
+def test_changes_gone_once_tombstones_are_pruned(auth_header):
+    deleted = client.post("/api/tasks/", json={"title": "Deleted long ago"}, headers=auth_header).json()["id"]
+    client.delete(f"/api/tasks/{deleted}", headers=auth_header)
+    synced = client.get("/api/tasks/changes", params={"since": 0}, headers=auth_header).json()["revision"]
+    kept = client.post("/api/tasks/", json={"title": "Kept"}, headers=auth_header).json()["id"]
+    with SessionLocal() as db:
+        assert task_crud.prune_tombstones(db, datetime.now(timezone.utc) + timedelta(seconds=1)) == 1
+        assert task_crud.prune_tombstones(db, datetime.now(timezone.utc) + timedelta(seconds=1)) == 0
+
+    assert client.get("/api/tasks/changes", params={"since": 0}, headers=auth_header).status_code == 410
+    resp = client.get("/api/tasks/changes", params={"since": synced}, headers=auth_header)
+    assert [c["id"] for c in resp.json()["changes"]] == [kept]
+    full = client.get("/api/tasks/changes", headers=auth_header).json()["changes"]
+    assert [(c["id"], c["deleted"]) for c in full] == [(kept, False)]
+
+def test_archived_tasks_listed_on_request(auth_header):
+    done = client.post("/api/tasks/", json={"title": "Done long ago", "status": "COMPLETED"}, headers=auth_header).json()["id"]
+    todo = client.post("/api/tasks/", json={"title": "Still to do"}, headers=auth_header).json()["id"]
+    etag = client.get("/api/tasks/", headers=auth_header).headers["etag"]
+    with SessionLocal() as db:
+        assert task_crud.archive_completed_tasks(db, datetime.now(timezone.utc) + timedelta(seconds=1)) == 1
+        assert task_crud.archive_completed_tasks(db, datetime.now(timezone.utc) + timedelta(seconds=1)) == 0
+
+    resp = client.get("/api/tasks/", headers={**auth_header, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert [t["id"] for t in resp.json()["items"]] == [todo]
+    completed = client.get("/api/tasks/", params={"status": "COMPLETED"}, headers=auth_header).json()
+    assert [t["id"] for t in completed["items"]] == [done]
+    assert completed["total"] == 1
+
+    first = client.get("/api/tasks/", params={"include_archived": "true", "size": 1}, headers=auth_header).json()
+    assert first["total"] == 2
+    rest = client.get("/api/tasks/", params={"include_archived": "true", "size": 1, "cursor": first["next_cursor"]}, headers=auth_header).json()
+    assert [t["id"] for t in first["items"] + rest["items"]] == [done, todo]
+
+    assert client.get(f"/api/tasks/{done}", headers=auth_header).json()["status"] == "COMPLETED"
+    changes = client.get("/api/tasks/changes", headers=auth_header).json()["changes"]
+    assert sorted(c["id"] for c in changes) == [done, todo]
+
+    def exported(**params):
+        resp = client.get("/api/tasks/export", params=params, headers=auth_header)
+        return [json.loads(line)["id"] for line in resp.text.splitlines()]
+    assert exported() == [todo]
+    assert exported(include_archived="true") == [done, todo]
+    assert exported(status="COMPLETED") == [done]
+
+    # a write moves the task back to tasks
+    resp = client.put(f"/api/tasks/{done}", json={"title": "Reopened"}, headers=auth_header)
+    assert resp.status_code == 200
+    assert (resp.json()["title"], resp.json()["status"]) == ("Reopened", "COMPLETED")
+    assert [t["id"] for t in client.get("/api/tasks/", headers=auth_header).json()["items"]] == [done, todo]
+
+    others = [client.post("/api/tasks/", json={"title": f"Done {i}", "status": "COMPLETED"}, headers=auth_header).json()["id"]
+              for i in range(2)]
+    with SessionLocal() as db:
+        assert task_crud.archive_completed_tasks(db, datetime.now(timezone.utc) + timedelta(seconds=1)) == 3
+    resp = client.patch("/api/tasks/bulk", json={"ids": [others[0]], "status": "NEW"}, headers=auth_header)
+    assert [r["result"] for r in resp.json()["results"]] == ["SUCCESS"]
+    assert client.delete(f"/api/tasks/{others[1]}", headers=auth_header).status_code == 200
+    resp = client.request("DELETE", "/api/tasks/bulk", json={"ids": [done]}, headers=auth_header)
+    assert [r["result"] for r in resp.json()["results"]] == ["SUCCESS"]
+    assert client.get(f"/api/tasks/{done}", headers=auth_header).status_code == 404
+
+    listed = client.get("/api/tasks/", params={"include_archived": "true"}, headers=auth_header).json()
+    assert [(t["id"], t["status"]) for t in listed["items"]] == [(todo, "NEW"), (others[0], "NEW")]
+    assert client.get("/api/tasks/", params={"status": "COMPLETED", "include_archived": "true"}, headers=auth_header).json()["total"] == 0
+    changes = client.get("/api/tasks/changes", headers=auth_header).json()["changes"]
+    assert sorted((c["id"], c["deleted"]) for c in changes) == sorted(
+        [(todo, False), (others[0], False), (others[1], True), (done, True)]
+    )
+
+def test_search_tasks(auth_header, register_user):
+    for title, description in [("Buy milk", "and bread"), ("Call the plumber", "kitchen sink leaks"),
+                               ("Fix sink", "bathroom sink drips"), ("Plan trip", None)]:
+        client.post("/api/tasks/", json={"title": title, "description": description}, headers=auth_header)
+    client.post("/api/tasks/", json={"title": "Someone else's sink"}, headers=register_user("searcher"))
+
+    resp = client.get("/api/tasks/search", params={"q": "sinks", "size": 1}, headers=auth_header)
+    assert resp.status_code == 200
+    first = resp.json()
+    # two mentions rank above one
+    assert [t["title"] for t in first["items"]] == ["Fix sink"]
+    assert first["has_next"] is True and first["total"] is None
+    rest = client.get("/api/tasks/search", params={"q": "sinks", "size": 1, "cursor": first["next_cursor"]}, headers=auth_header).json()
+    assert [t["title"] for t in rest["items"]] == ["Call the plumber"]
+    assert rest["has_next"] is False
+
+    client.put(f"/api/tasks/{rest['items'][0]['id']}", json={"description": "garden hose"}, headers=auth_header)
+    titles = [t["title"] for t in client.get("/api/tasks/search", params={"q": "sink"}, headers=auth_header).json()["items"]]
+    assert titles == ["Fix sink"]
+    assert client.get("/api/tasks/search", params={"q": "milk bread"}, headers=auth_header).json()["items"][0]["title"] == "Buy milk"
+    assert client.get("/api/tasks/search", params={"q": "!!"}, headers=auth_header).json()["items"] == []
+    assert client.get("/api/tasks/search", params={"q": "sink", "cursor": "not-a-cursor"}, headers=auth_header).status_code == 400
+
+def test_task_stats(auth_header):
+    def stats():
+        return client.get("/api/tasks/stats", headers=auth_header).json()
+
+    assert stats() == {"counts": {"NEW": 0, "IN_PROGRESS": 0, "COMPLETED": 0}, "total": 0}
+    first = client.post("/api/tasks/", json={"title": "First"}, headers=auth_header).json()["id"]
+    client.put(f"/api/tasks/{first}", json={"status": "IN_PROGRESS"}, headers=auth_header)
+    ids = [r["id"] for r in client.post("/api/tasks/bulk", json={"items": [{"title": f"Bulk {i}"} for i in range(3)]}, headers=auth_header).json()["results"]]
+    client.patch("/api/tasks/bulk", json={"ids": ids[:2] + [first], "status": "COMPLETED"}, headers=auth_header)
+    client.delete(f"/api/tasks/{ids[0]}", headers=auth_header)
+    client.request("DELETE", "/api/tasks/bulk", json={"ids": [ids[2]]}, headers=auth_header)
+    client.post("/api/tasks/import", files={"file": ("tasks.ndjson", '{"title": "Imported", "status": "IN_PROGRESS"}\n')}, headers=auth_header)
+    with SessionLocal() as db:
+        task_crud.archive_completed_tasks(db, datetime.now(timezone.utc) + timedelta(seconds=1))
+
+    resp = client.get("/api/tasks/stats", headers=auth_header)
+    assert resp.json() == {"counts": {"NEW": 0, "IN_PROGRESS": 1, "COMPLETED": 2}, "total": 3}
+    assert client.get("/api/tasks/stats", headers={**auth_header, "If-None-Match": resp.headers["etag"]}).status_code == 304
+
+    # drift the counts behind the API's back, then repair them
+    with SessionLocal() as db:
+        user_id = db.scalar(select(User.id).where(User.username == "testuser"))
+        task_crud.adjust_status_counts(db, user_id, added=[TaskStatus.NEW] * 5)
+        db.commit()
+        assert stats()["counts"]["NEW"] == 5
+        task_crud.rebuild_status_counts(db, [user_id])
+    resp = client.get("/api/tasks/stats", headers={**auth_header, "If-None-Match": resp.headers["etag"]})
+    assert resp.json()["counts"] == {"NEW": 0, "IN_PROGRESS": 1, "COMPLETED": 2}